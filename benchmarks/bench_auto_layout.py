@@ -0,0 +1,144 @@
+import argparse
+import json
+import pathlib
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from sprite_rips_to_mm_sprite_resources import LAYOUT_GAP, PACKING_ENGINES, SpriteRecord, auto_layout, layout_for_width
+
+DEFAULT_FRAME_COUNTS = (100, 500, 1000, 2000, 5000, 10000, 20000)
+# Free-form packers timed next to the shelf search, up to --packer-limit frames.
+DEFAULT_PACKERS = ("maxrects",)
+
+
+def make_sprites(count: int, is_hd: bool, seed: int) -> List[SpriteRecord]:
+    generator = random.Random(seed)
+    sprites = []
+    for _ in range(count):
+        width = generator.randint(16, 256)
+        height = generator.randint(16, 256)
+        if is_hd:
+            width += width % 2
+            height += height % 2
+        # Layout reads only the sizes, so the records carry no pixels.
+        sprites.append(SpriteRecord((width, height), (0, 0), (width, height), (0, 0), (True, True)))
+    return sprites
+
+
+def quadratic_auto_layout(sprites: Sequence[SpriteRecord], is_hd: bool, max_height: Optional[int] = None) -> Dict[str, Any]:
+    # The previous search: one full layout_for_width per candidate width.
+    gap = LAYOUT_GAP if is_hd else 1
+    widths = [sprite.width for sprite in sprites]
+    max_width = max(widths)
+    candidate_widths = {max_width, sum(widths) + gap * (len(sprites) - 1)}
+    prefix = 0
+    for index, width in enumerate(widths):
+        prefix += width
+        candidate_widths.add(max(max_width, prefix + gap * index))
+    best_layout = None
+    best_score: Optional[Tuple[float, float, float]] = None
+    for width_limit in sorted(candidate_widths):
+        layout = layout_for_width(sprites, int(round(width_limit)), is_hd)
+        if max_height is not None and layout["height"] > max_height:
+            continue
+        diff = abs(layout["width"] - layout["height"])
+        area = float(layout["width"] * max(layout["height"], 1))
+        height_gap = abs(max_height - layout["height"]) if max_height is not None else 0.0
+        score = (height_gap, diff, area)
+        if best_score is None or score < best_score:
+            best_layout = layout
+            best_score = score
+    return best_layout
+
+
+def run(
+    frame_counts: Sequence[int],
+    quadratic_limit: int,
+    is_hd: bool,
+    seed: int,
+    packers: Sequence[str] = DEFAULT_PACKERS,
+    packer_limit: int = 5000
+) -> List[Dict[str, Any]]:
+    results = []
+    for count in frame_counts:
+        sprites = make_sprites(count, is_hd, seed)
+        started = time.perf_counter()
+        layout = auto_layout(sprites, is_hd)
+        elapsed = time.perf_counter() - started
+        entry: Dict[str, Any] = {
+            "frames": count,
+            "seconds": round(elapsed, 4),
+            "sheet_size": [layout["width"], layout["height"]],
+        }
+        if count <= quadratic_limit:
+            started = time.perf_counter()
+            reference = quadratic_auto_layout(sprites, is_hd)
+            entry["quadratic_seconds"] = round(time.perf_counter() - started, 4)
+            entry["matches_quadratic"] = reference == layout
+        if count <= packer_limit:
+            entry["packers"] = {}
+            for packer in packers:
+                started = time.perf_counter()
+                packed = auto_layout(sprites, is_hd, packer=packer)
+                entry["packers"][packer] = {
+                    "seconds": round(time.perf_counter() - started, 4),
+                    "sheet_size": [packed["width"], packed["height"]],
+                }
+        results.append(entry)
+        line = f"{count:>6} frames  {entry['seconds']:>9.4f}s  sheet {layout['width']}x{layout['height']}"
+        if "quadratic_seconds" in entry:
+            line += f"  quadratic {entry['quadratic_seconds']:>9.4f}s  same={entry['matches_quadratic']}"
+        for packer, measured in entry.get("packers", {}).items():
+            line += f"  {packer} {measured['seconds']:>9.4f}s"
+        print(line, file=sys.stderr)
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the automatic layout width search of the packers.")
+    parser.add_argument("--frames", type=int, nargs="+", default=list(DEFAULT_FRAME_COUNTS))
+    parser.add_argument(
+        "--quadratic-limit",
+        type=int,
+        default=2000,
+        help="Also time the previous O(n^2) search up to this many frames and check both agree.",
+    )
+    parser.add_argument(
+        "--packers",
+        nargs="*",
+        choices=[packer for packer in PACKING_ENGINES if packer != "shelf"],
+        default=list(DEFAULT_PACKERS),
+        help="Free-form packers whose automatic layout is timed as well.",
+    )
+    parser.add_argument(
+        "--packer-limit",
+        type=int,
+        default=5000,
+        help="Only time the free-form packers up to this many frames.",
+    )
+    parser.add_argument("--sd", action="store_true", help="Use the non-HD gap and alignment rules.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=pathlib.Path, default=None, help="Write the results as JSON to this file.")
+    arguments = parser.parse_args(argv)
+
+    results = run(
+        arguments.frames,
+        arguments.quadratic_limit,
+        not arguments.sd,
+        arguments.seed,
+        arguments.packers,
+        arguments.packer_limit,
+    )
+    text = json.dumps({"benchmark": "auto_layout", "is_hd": not arguments.sd, "results": results}, indent=2)
+    print(text)
+    if arguments.output is not None:
+        arguments.output.write_text(text + "\n", encoding="utf-8")
+    return 0 if all(entry.get("matches_quadratic", True) for entry in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
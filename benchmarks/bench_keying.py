@@ -0,0 +1,141 @@
+import argparse
+import json
+import pathlib
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from sprite_rips_to_mm_sprite_resources import remove_color_and_trim, remove_color_with_threshold, trim_color
+
+FRAME_SIZES = {"1080p": (1920, 1080), "4k": (3840, 2160)}
+KEY_COLOR = (0, 255, 0, 255)
+
+
+def make_frame(width: int, height: int, seed: int) -> Image.Image:
+    # A keyed backdrop with sensor noise around a solid subject in the middle.
+    generator = np.random.default_rng(seed)
+    pixels = np.empty((height, width, 4), dtype=np.uint8)
+    pixels[..., :3] = np.clip(
+        generator.normal(0, 12, (height, width, 3)) + np.array(KEY_COLOR[:3]), 0, 255
+    ).astype(np.uint8)
+    pixels[..., 3] = 255
+    top, left = height // 4, width // 3
+    pixels[top:height - top, left:width - left, :3] = generator.integers(0, 256, (height - 2 * top, width - 2 * left, 3))
+    return Image.fromarray(pixels, "RGBA")
+
+
+def previous_remove_color_with_threshold(image: Image.Image, target_color: Tuple[int, int, int, int], threshold: float, reduce_file_size) -> Image.Image:
+    im = image.convert("RGBA")
+    arr = np.asarray(im).copy()
+    rgb = arr[..., :3].astype(np.int32)
+    alpha = arr[..., 3]
+    tr, tg, tb, _ = target_color
+    diff = rgb - np.array([tr, tg, tb], dtype=np.int32)
+    dist2 = (diff * diff).sum(axis=2)
+    mask = (alpha != 0) & (dist2 <= int(threshold * threshold))
+    if not reduce_file_size:
+        arr[mask, 3] = 0
+    else:
+        arr[mask] = 0
+    return Image.fromarray(arr, "RGBA")
+
+
+def previous_trim_color(image: Image.Image, color: Tuple[int, int, int, int], threshold: float) -> Tuple[Image.Image, Tuple[int, int]]:
+    # The previous trim_color without HD alignment.
+    img = image if image.mode == "RGBA" else image.convert("RGBA")
+    arr = np.asarray(img, dtype=np.uint8)
+    diffs = [arr[..., index].astype(np.int32) - color[index] for index in range(4)]
+    neq = sum(diff * diff for diff in diffs) > int(threshold * threshold)
+    if not np.any(neq):
+        return image, (0, 0)
+    rows = np.any(neq, axis=1)
+    cols = np.any(neq, axis=0)
+    h, w = neq.shape
+    left, top = int(np.argmax(cols)), int(np.argmax(rows))
+    right, bottom = int(w - np.argmax(cols[::-1])), int(h - np.argmax(rows[::-1]))
+    return img.crop((left, top, right, bottom)), (left, top)
+
+
+def best_time(function: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def run(sizes: Sequence[str], threshold: float, repeat: int, seed: int) -> List[Dict[str, Any]]:
+    results = []
+    for name in sizes:
+        width, height = FRAME_SIZES[name]
+        frame = make_frame(width, height, seed)
+
+        def previous_key_and_trim() -> Tuple[Image.Image, Tuple[int, int]]:
+            keyed = previous_remove_color_with_threshold(frame, KEY_COLOR, threshold, False)
+            bbox = keyed.getchannel("A").getbbox()
+            return keyed.crop(bbox), bbox[:2]
+
+        cases = {
+            "key": (
+                lambda: previous_remove_color_with_threshold(frame, KEY_COLOR, threshold, False),
+                lambda: remove_color_with_threshold(frame, KEY_COLOR, threshold, False),
+            ),
+            "trim_opaque_key": (
+                lambda: previous_trim_color(frame, KEY_COLOR, threshold),
+                lambda: trim_color(frame, KEY_COLOR, threshold, False),
+            ),
+            "key_and_trim": (
+                previous_key_and_trim,
+                lambda: remove_color_and_trim(frame, KEY_COLOR, threshold, False, False),
+            ),
+        }
+        for case, (previous, current) in cases.items():
+            previous_seconds, expected = best_time(previous, repeat)
+            current_seconds, actual = best_time(current, repeat)
+            if case == "key":
+                same = np.array_equal(np.asarray(expected), np.asarray(actual))
+            else:
+                same = expected[1] == actual[1] and np.array_equal(np.asarray(expected[0]), np.asarray(actual[0]))
+            entry = {
+                "frame": name,
+                "case": case,
+                "previous_ms": round(previous_seconds * 1000, 2),
+                "ms": round(current_seconds * 1000, 2),
+                "speedup": round(previous_seconds / current_seconds, 2),
+                "identical": bool(same),
+            }
+            results.append(entry)
+            print(
+                f"{name:>6} {case:<16} previous {entry['previous_ms']:>9.2f}ms  now {entry['ms']:>9.2f}ms"
+                f"  x{entry['speedup']:<5} same={entry['identical']}",
+                file=sys.stderr,
+            )
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark per-frame background keying and trimming.")
+    parser.add_argument("--sizes", nargs="+", choices=sorted(FRAME_SIZES), default=list(FRAME_SIZES))
+    parser.add_argument("--threshold", type=float, default=100)
+    parser.add_argument("--repeat", type=int, default=5, help="Keep the best of this many runs per case.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=pathlib.Path, default=None, help="Write the results as JSON to this file.")
+    arguments = parser.parse_args(argv)
+
+    results = run(arguments.sizes, arguments.threshold, arguments.repeat, arguments.seed)
+    text = json.dumps({"benchmark": "keying", "threshold": arguments.threshold, "results": results}, indent=2)
+    print(text)
+    if arguments.output is not None:
+        arguments.output.write_text(text + "\n", encoding="utf-8")
+    return 0 if all(entry["identical"] for entry in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+import argparse
+import contextlib
+import io
+import json
+import pathlib
+import sys
+import tempfile
+import tracemalloc
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from bench_pipeline import environment
+from synthetic_subject import add_spec_arguments, make_synthetic_subject, spec_from_arguments
+from sprite_rips_to_mm_sprite_resources import (
+    GenerateOptions,
+    SpriteRecord,
+    StageProfiler,
+    collect_animation_directories,
+    collect_sprite_paths,
+    generate,
+    load_animation_config,
+    load_subject_config,
+    process_sprites,
+)
+
+MB = 1024 * 1024
+# Spans too frequent to snapshot; their memory shows up in the enclosing animation.
+FRAME_SPANS = ("frame", "frame_cache_lookup", "frame_cache_store")
+# Stages whose PIL images live outside the Python allocator, so tracemalloc
+# cannot see them; their size is estimated from the pixel count instead.
+IMAGE_STAGES = ("create_sprite_sheet", "save_half_sheet")
+
+
+def current_rss() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as handle:
+            pages = int(handle.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * resource.getpagesize() if resource is not None else None
+
+
+def peak_rss() -> Optional[int]:
+    # VmHWM follows reset_peak_rss; ru_maxrss covers the whole process.
+    with contextlib.suppress(OSError, ValueError):
+        with open("/proc/self/status", "r", encoding="ascii") as handle:
+            for line in handle:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def reset_peak_rss() -> None:
+    # Linux 4.0+ lets a process reset its high-water mark; elsewhere the
+    # peak simply covers the whole process.
+    with contextlib.suppress(OSError):
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as handle:
+            handle.write("5")
+
+
+class MemoryProfiler(StageProfiler):
+    # Samples tracemalloc and RSS each time a stage span closes. The traced
+    # peak is reset at every boundary, so each entry holds the peak reached
+    # during that stage.
+
+    def __init__(self, top: int) -> None:
+        super().__init__()
+        self.top = top
+        self.boundaries: List[Dict[str, Any]] = []
+
+    def record(self, name: str, start: float, end: float, cpu_seconds: float, args: Dict[str, Any], pid: Optional[int] = None) -> None:
+        super().record(name, start, end, cpu_seconds, args, pid)
+        if pid is not None or name in FRAME_SPANS:
+            return
+        traced_current, traced_peak = tracemalloc.get_traced_memory()
+        boundary: Dict[str, Any] = {
+            "stage": name,
+            "traced_current_bytes": traced_current,
+            "traced_peak_bytes": traced_peak,
+            "rss_bytes": current_rss(),
+            "peak_rss_bytes": peak_rss(),
+        }
+        if "animation" in args:
+            boundary["animation"] = args["animation"]
+        if name in IMAGE_STAGES:
+            boundary["image_bytes"] = args.get("pixels", 0) * 4
+        if self.top > 0:
+            snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+            boundary["top_allocations"] = [
+                {"site": str(statistic.traceback), "bytes": statistic.size, "blocks": statistic.count}
+                for statistic in snapshot.statistics("lineno")[:self.top]
+            ]
+        self.boundaries.append(boundary)
+        tracemalloc.reset_peak()
+
+
+def measure_stage_boundaries(subject_dir: pathlib.Path, is_hd: bool, top: int) -> Dict[str, Any]:
+    profiler = MemoryProfiler(top)
+    reset_peak_rss()
+    baseline_rss = current_rss()
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate(subject_dir, GenerateOptions(is_hd=is_hd, profiler=profiler))
+        _, traced_peak = tracemalloc.get_traced_memory()
+        traced_peak = max([traced_peak] + [boundary["traced_peak_bytes"] for boundary in profiler.boundaries])
+    finally:
+        tracemalloc.stop()
+    return {
+        "baseline_rss_bytes": baseline_rss,
+        "peak_rss_bytes": peak_rss(),
+        "traced_peak_bytes": traced_peak,
+        "stages": profiler.boundaries,
+    }
+
+
+def sprite_record_bytes(sprite: SpriteRecord) -> Dict[str, int]:
+    # The arena is shared by the records of an animation and counted separately.
+    image_bytes = sprite.width * sprite.height * 4
+    overhead = sys.getsizeof(sprite)
+    for name in SpriteRecord.__slots__:
+        value = getattr(sprite, name)
+        if name == "arena" or value is None:
+            continue
+        overhead += sys.getsizeof(value)
+        if isinstance(value, tuple):
+            overhead += sum(sys.getsizeof(item) for item in value)
+    return {"image_bytes": image_bytes, "overhead_bytes": overhead}
+
+
+def measure_sprite_records(subject_dir: pathlib.Path, is_hd: bool) -> Dict[str, Any]:
+    # Runs process_sprites on every animation and accounts for what each
+    # resulting sprite record keeps alive: its pixels plus the Python objects.
+    subject_config = load_subject_config(subject_dir)
+    sprites: List[SpriteRecord] = []
+    with tempfile.TemporaryDirectory(prefix="sprite_bench_frames_") as scratch:
+        tracemalloc.start()
+        try:
+            before, _ = tracemalloc.get_traced_memory()
+            for animation_dir in collect_animation_directories(subject_dir / "raw"):
+                sprites.extend(process_sprites(
+                    collect_sprite_paths(animation_dir),
+                    pathlib.Path(scratch) / animation_dir.name,
+                    False,
+                    subject_config,
+                    load_animation_config(animation_dir, is_hd),
+                    is_hd,
+                ))
+            after, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    sizes = [sprite_record_bytes(sprite) for sprite in sprites]
+    arenas = {id(sprite.arena): sprite.arena for sprite in sprites}
+    totals = [size["image_bytes"] + size["overhead_bytes"] for size in sizes]
+    count = max(1, len(sprites))
+    return {
+        "sprites": len(sprites),
+        "arenas": len(arenas),
+        "image_bytes": sum(size["image_bytes"] for size in sizes),
+        "overhead_bytes": sum(size["overhead_bytes"] for size in sizes) + sum(sys.getsizeof(arena) for arena in arenas.values()),
+        "traced_retained_bytes": after - before,
+        "bytes_per_sprite": sum(totals) // count,
+        "max_bytes_per_sprite": max(totals, default=0),
+    }
+
+
+def check_thresholds(results: Dict[str, Any], arguments: argparse.Namespace) -> List[str]:
+    failures = []
+    checks = (
+        ("peak RSS", results["stage_boundaries"]["peak_rss_bytes"], arguments.max_peak_rss_mb, MB),
+        ("traced peak", results["stage_boundaries"]["traced_peak_bytes"], arguments.max_traced_peak_mb, MB),
+        ("bytes per sprite", results["sprite_records"]["bytes_per_sprite"], arguments.max_bytes_per_sprite, 1),
+    )
+    for label, measured, limit, unit in checks:
+        if limit is None or measured is None:
+            continue
+        if measured > limit * unit:
+            failures.append(f"{label} {measured / unit:.1f} exceeds {limit}")
+
+    if arguments.baseline is not None:
+        baseline = json.loads(arguments.baseline.read_text(encoding="utf-8"))
+        # Results written before sprites became records call them sprite_dicts.
+        baseline_sprites = baseline.get("sprite_records", baseline.get("sprite_dicts", {}))
+        pairs = (
+            ("peak RSS", results["stage_boundaries"]["peak_rss_bytes"], baseline["stage_boundaries"].get("peak_rss_bytes")),
+            ("traced peak", results["stage_boundaries"]["traced_peak_bytes"], baseline["stage_boundaries"].get("traced_peak_bytes")),
+            ("bytes per sprite", results["sprite_records"]["bytes_per_sprite"], baseline_sprites.get("bytes_per_sprite")),
+        )
+        for label, measured, before in pairs:
+            if not measured or not before:
+                continue
+            if measured > before * (1 + arguments.tolerance):
+                failures.append(f"{label} grew from {before} to {measured} bytes")
+    return failures
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    boundaries = results["stage_boundaries"]
+    for boundary in boundaries["stages"]:
+        label = boundary["stage"] + (f" {boundary['animation']}" if "animation" in boundary else "")
+        rss = boundary["rss_bytes"]
+        line = f"{label:<32} traced {boundary['traced_current_bytes'] / MB:>8.1f}MB  stage peak {boundary['traced_peak_bytes'] / MB:>8.1f}MB"
+        if rss is not None:
+            line += f"  rss {rss / MB:>8.1f}MB"
+        if "image_bytes" in boundary:
+            line += f"  image {boundary['image_bytes'] / MB:.1f}MB"
+        print(line, file=sys.stderr)
+    if boundaries["peak_rss_bytes"] is not None:
+        print(f"peak RSS {boundaries['peak_rss_bytes'] / MB:.1f}MB", file=sys.stderr)
+    for name, size in sorted(results["breakdown"].items(), key=lambda item: -item[1]):
+        print(f"{name:<32} {size / MB:>8.1f}MB", file=sys.stderr)
+    sprite_records = results["sprite_records"]
+    print(
+        f"{sprite_records['sprites']} sprite records in {sprite_records['arenas']} arenas hold "
+        f"{sprite_records['image_bytes'] / MB:.1f}MB of pixels and "
+        f"{sprite_records['overhead_bytes'] / 1024:.1f}KB of objects, {sprite_records['bytes_per_sprite']} bytes each",
+        file=sys.stderr,
+    )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure peak memory at every stage boundary of the generator on a synthetic subject."
+    )
+    add_spec_arguments(parser)
+    parser.add_argument("--top", type=int, default=5, help="Allocation sites listed per stage (0 skips snapshots).")
+    parser.add_argument("--output", type=pathlib.Path, default=None, help="Write the results as JSON to this file.")
+    parser.add_argument("--max-peak-rss-mb", type=float, default=None, help="Fail when the peak RSS exceeds this.")
+    parser.add_argument("--max-traced-peak-mb", type=float, default=None, help="Fail when the tracemalloc peak exceeds this.")
+    parser.add_argument("--max-bytes-per-sprite", type=int, default=None, help="Fail when a sprite record holds more on average.")
+    parser.add_argument("--baseline", type=pathlib.Path, default=None, help="Fail when memory grew past a previous JSON result.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative growth over the baseline that fails.")
+    arguments = parser.parse_args(argv)
+    spec = spec_from_arguments(arguments)
+
+    with tempfile.TemporaryDirectory(prefix="sprite_bench_") as scratch:
+        subject_dir = make_synthetic_subject(pathlib.Path(scratch), spec)
+        results: Dict[str, Any] = {
+            "benchmark": "memory",
+            "subject": vars(spec).copy(),
+            "environment": environment(),
+            "stage_boundaries": measure_stage_boundaries(subject_dir, spec.is_hd, arguments.top),
+            "sprite_records": measure_sprite_records(subject_dir, spec.is_hd),
+        }
+
+    image_bytes = {boundary["stage"]: boundary["image_bytes"] for boundary in results["stage_boundaries"]["stages"] if "image_bytes" in boundary}
+    results["breakdown"] = {
+        "processed_sprites_bytes": results["sprite_records"]["image_bytes"] + results["sprite_records"]["overhead_bytes"],
+        "sheet_image_bytes": image_bytes.get("create_sprite_sheet", 0),
+        "sheet_half_bytes": image_bytes.get("save_half_sheet", 0),
+    }
+
+    failures = check_thresholds(results, arguments)
+    results["failures"] = failures
+    print_report(results)
+    text = json.dumps(results, indent=2)
+    print(text)
+    if arguments.output is not None:
+        arguments.output.write_text(text + "\n", encoding="utf-8")
+    for failure in failures:
+        print(f"FAILED: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
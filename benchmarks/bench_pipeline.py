@@ -0,0 +1,278 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import pathlib
+import platform
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import PIL
+from PIL import Image
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from synthetic_subject import add_spec_arguments, make_synthetic_subject, spec_from_arguments
+from sprite_rips_to_mm_sprite_resources import (
+    GenerateOptions,
+    RESAMPLE_NEAREST,
+    SpriteRecord,
+    StageProfiler,
+    collect_animation_directories,
+    collect_sprite_paths,
+    create_sprite_sheet,
+    build_sprite_records,
+    export_sprite_metadata,
+    generate,
+    load_animation_config,
+    load_subject_config,
+    process_sprite_image,
+    remove_color_with_threshold,
+    resize_image,
+    run_concurrently,
+    select_layout,
+    trim_color,
+)
+
+# Stages in pipeline order. keying, resize and trim time the individual
+# steps; process_frame times the combined per-frame path the generator uses.
+STAGES = (
+    "config_load",
+    "decode",
+    "keying",
+    "resize",
+    "trim",
+    "process_frame",
+    "frame_encode",
+    "layout",
+    "composition",
+    "half_res",
+    "metadata_export",
+    "encode",
+)
+
+
+class StageTimer:
+
+    def __init__(self) -> None:
+        self.seconds: Dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - started
+
+
+def run_stages(subject_dir: pathlib.Path, is_hd: bool, reduce_file_size: bool) -> Dict[str, float]:
+    timer = StageTimer()
+
+    with timer.stage("config_load"):
+        subject_config = load_subject_config(subject_dir)
+        animation_dirs = collect_animation_directories(subject_dir / "raw")
+        animation_configs = [load_animation_config(animation_dir, is_hd) for animation_dir in animation_dirs]
+        sprite_paths = [collect_sprite_paths(animation_dir) for animation_dir in animation_dirs]
+
+    decoded: List[Image.Image] = []
+    with timer.stage("decode"):
+        for paths in sprite_paths:
+            for sprite_path in paths:
+                with Image.open(sprite_path) as source_image:
+                    decoded.append(source_image.convert("RGBA"))
+
+    can_remove_color = subject_config.background_color is not None and subject_config.remove_background
+    keyed = decoded
+    if can_remove_color:
+        with timer.stage("keying"):
+            keyed = [
+                remove_color_with_threshold(image, subject_config.background_color, subject_config.color_threshold, reduce_file_size)
+                for image in decoded
+            ]
+    resized = keyed
+    if subject_config.resize_to_percent not in (100, None):
+        with timer.stage("resize"):
+            resized = [resize_image(image, subject_config.resize_to_percent) for image in keyed]
+    if subject_config.crop_sprites:
+        crop_color = (0, 0, 0, 0) if can_remove_color else subject_config.background_color
+        with timer.stage("trim"):
+            for image in resized:
+                trim_color(image, crop_color, subject_config.color_threshold, is_hd)
+    del keyed, resized
+
+    sprites: List[SpriteRecord] = []
+    animations_meta: List[Dict[str, Any]] = []
+    with timer.stage("process_frame"):
+        results = [process_sprite_image(image, subject_config, is_hd, reduce_file_size) for image in decoded]
+    del decoded
+
+    frame_index = 0
+    for paths, animation_dir, animation_config in zip(sprite_paths, animation_dirs, animation_configs):
+        sprites.extend(build_sprite_records(
+            results[frame_index:frame_index + len(paths)],
+            animation_config.offset,
+            animation_config.recover_cropped_offset,
+        ))
+        animations_meta.append({
+            "name": animation_dir.name,
+            "frames": list(range(frame_index, frame_index + len(paths))),
+            "delay": animation_config.delay,
+        })
+        frame_index += len(paths)
+
+    with timer.stage("frame_encode"):
+        for sprite in sprites:
+            sprite.image().save(io.BytesIO(), format="PNG", optimize=reduce_file_size, compress_level=0)
+
+    forced_width, forced_height = subject_config.sheet_dimensions
+    with timer.stage("layout"):
+        layout_info = select_layout(sprites, forced_width, forced_height, is_hd, subject_config.sheet_packer)
+    canvas_size = (layout_info["canvas_width"], layout_info["canvas_height"])
+
+    with timer.stage("composition"):
+        sheet_image = create_sprite_sheet(sprites, layout_info["positions"], canvas_size)
+
+    if is_hd:
+        with timer.stage("half_res"):
+            half_size = (max(1, (sheet_image.width + 1) // 2), max(1, (sheet_image.height + 1) // 2))
+            sheet_half = sheet_image.resize(half_size, RESAMPLE_NEAREST)
+
+    with timer.stage("metadata_export"):
+        payload = export_sprite_metadata(sprites, layout_info["positions"], canvas_size, animations_meta, "", is_hd)
+
+    # The generator encodes both sheets and the .sprite file together.
+    jobs = [lambda: sheet_image.save(io.BytesIO(), format="PNG", optimize=reduce_file_size), lambda: json.dumps(payload, indent=2)]
+    if is_hd:
+        jobs.append(lambda: sheet_half.save(io.BytesIO(), format="PNG"))
+    with timer.stage("encode"):
+        run_concurrently(jobs)
+
+    return timer.seconds
+
+
+def run_end_to_end(subject_dir: pathlib.Path, is_hd: bool, reduce_file_size: bool) -> Tuple[float, Dict[str, Any]]:
+    # A real generate() run with the profiler on, so the spans the generator
+    # records itself can be checked against the stages timed above.
+    profiler = StageProfiler()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        generate(subject_dir, GenerateOptions(is_hd=is_hd, reduce_file_size=reduce_file_size, profiler=profiler))
+    return time.perf_counter() - started, profiler.summary()["stages"]
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    # Stages (and the end-to-end run) that got slower than the baseline by
+    # more than the tolerance. Differences under 5ms are timer noise.
+    regressions = []
+    current = dict(results["stages"], end_to_end=results["end_to_end_seconds"])
+    previous = dict(baseline.get("stages", {}), end_to_end=baseline.get("end_to_end_seconds"))
+    for name, seconds in current.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        ratio = seconds / before
+        marker = ""
+        if ratio > 1 + tolerance and seconds - before > 0.005:
+            marker = "  SLOWER"
+            regressions.append(name)
+        print(f"{name:<16} {before:>9.4f}s -> {seconds:>9.4f}s  x{ratio:.2f}{marker}", file=sys.stderr)
+    return regressions
+
+
+def run(subject_dir: pathlib.Path, is_hd: bool, reduce_file_size: bool, repeat: int) -> Dict[str, Any]:
+    # Each stage keeps its best time over the repeats.
+    best: Dict[str, float] = {}
+    for _ in range(repeat):
+        for name, seconds in run_stages(subject_dir, is_hd, reduce_file_size).items():
+            best[name] = min(seconds, best.get(name, seconds))
+    # The profiler spans are taken from the fastest end-to-end run.
+    end_to_end, spans = min(
+        (run_end_to_end(subject_dir, is_hd, reduce_file_size) for _ in range(repeat)), key=lambda item: item[0]
+    )
+    stages = {name: round(best[name], 4) for name in STAGES if name in best}
+    for name, seconds in stages.items():
+        print(f"{name:<16} {seconds:>9.4f}s", file=sys.stderr)
+    print(f"{'end_to_end':<16} {end_to_end:>9.4f}s", file=sys.stderr)
+    profile_stages = {
+        name: {
+            "count": totals["count"],
+            "wall_seconds": round(totals["wall_seconds"], 4),
+            "cpu_seconds": round(totals["cpu_seconds"], 4),
+        }
+        for name, totals in spans.items()
+    }
+    for name, totals in profile_stages.items():
+        print(f"  {name:<26} {totals['wall_seconds']:>9.4f}s  cpu {totals['cpu_seconds']:>9.4f}s  x{totals['count']}", file=sys.stderr)
+    return {"stages": stages, "end_to_end_seconds": round(end_to_end, 4), "profile_stages": profile_stages}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Time each stage of the generator on a synthetic subject (or an existing one)."
+    )
+    add_spec_arguments(parser)
+    parser.add_argument(
+        "--subject-dir",
+        type=pathlib.Path,
+        default=None,
+        help="Benchmark this existing subject folder instead of a synthetic one (its generated/ folder is rewritten).",
+    )
+    parser.add_argument("--reduce-file-size", action="store_true")
+    parser.add_argument("--repeat", type=int, default=3, help="Keep the best of this many runs per stage.")
+    parser.add_argument("--output", type=pathlib.Path, default=None, help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", type=pathlib.Path, default=None, help="Compare against a previous JSON result.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.15,
+        help="Relative slowdown over the baseline that counts as a regression.",
+    )
+    arguments = parser.parse_args(argv)
+    spec = spec_from_arguments(arguments)
+
+    with tempfile.TemporaryDirectory(prefix="sprite_bench_") as scratch:
+        if arguments.subject_dir is not None:
+            subject_dir = arguments.subject_dir.resolve()
+            subject: Dict[str, Any] = {"path": str(subject_dir), "is_hd": spec.is_hd}
+        else:
+            subject_dir = make_synthetic_subject(pathlib.Path(scratch), spec)
+            subject = vars(spec).copy()
+        measured = run(subject_dir, spec.is_hd, arguments.reduce_file_size, max(1, arguments.repeat))
+
+    results = {
+        "benchmark": "pipeline",
+        "subject": subject,
+        "reduce_file_size": arguments.reduce_file_size,
+        "repeat": arguments.repeat,
+        "environment": environment(),
+        **measured,
+    }
+    text = json.dumps(results, indent=2)
+    print(text)
+    if arguments.output is not None:
+        arguments.output.write_text(text + "\n", encoding="utf-8")
+
+    if arguments.baseline is not None:
+        baseline = json.loads(arguments.baseline.read_text(encoding="utf-8"))
+        if compare(results, baseline, arguments.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
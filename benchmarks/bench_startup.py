@@ -0,0 +1,158 @@
+import argparse
+import json
+import pathlib
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional, Sequence
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from bench_pipeline import environment
+
+PACKAGE_DIR = pathlib.Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ("numpy", "PIL.Image")
+# Budgets for a warm start (bytecode already cached) on the reference
+# machine; --max-* overrides them.
+DEFAULT_MAX_FIRST_WINDOW_MS = 400.0
+DEFAULT_MAX_GENERATOR_IMPORT_MS = 150.0
+
+# Each probe runs in a fresh interpreter and prints one JSON line.
+FIRST_WINDOW_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import tkinter
+try:
+    import sprite_rips_to_mm_sprite_resources_ui as ui
+    app = ui.ConfigManagerUI()
+    app.update()
+except tkinter.TclError as exc:
+    print(json.dumps({"skipped": str(exc)}))
+    sys.exit(0)
+seconds = time.perf_counter() - started
+loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+app.destroy()
+print(json.dumps({"seconds": seconds, "heavy_modules_loaded": loaded}))
+"""
+GENERATOR_IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import sprite_rips_to_mm_sprite_resources
+seconds = time.perf_counter() - started
+loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+print(json.dumps({"seconds": seconds, "heavy_modules_loaded": loaded}))
+"""
+
+
+def run_probe(source: str) -> Dict[str, Any]:
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n{source}"
+    completed = subprocess.run(
+        [sys.executable, "-c", code], cwd=PACKAGE_DIR, capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def best_probe(source: str, repeat: int) -> Dict[str, Any]:
+    # Keeps the fastest run; a skipped probe is reported as is.
+    best: Optional[Dict[str, Any]] = None
+    for _ in range(repeat):
+        result = run_probe(source)
+        if "skipped" in result:
+            return result
+        if best is None or result["seconds"] < best["seconds"]:
+            best = result
+    return {"ms": round(best["seconds"] * 1000, 1), "heavy_modules_loaded": best["heavy_modules_loaded"]}
+
+
+def import_time_breakdown(module: str, top: int) -> List[Dict[str, Any]]:
+    # Parses `python -X importtime`: the slowest imports by cumulative time.
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PACKAGE_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue
+        name = fields[2]
+        entries.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_ms": round(self_us / 1000, 2),
+            "cumulative_ms": round(cumulative_us / 1000, 2),
+        })
+    entries.sort(key=lambda entry: -entry["cumulative_ms"])
+    return entries[:top]
+
+
+def check_budgets(results: Dict[str, Any], arguments: argparse.Namespace) -> List[str]:
+    failures = []
+    checks = (
+        ("first window", results["first_window"], arguments.max_first_window_ms),
+        ("generator import", results["generator_import"], arguments.max_generator_import_ms),
+    )
+    for label, measured, limit in checks:
+        if "skipped" in measured:
+            continue
+        if measured["heavy_modules_loaded"]:
+            failures.append(f"{label} loaded {', '.join(measured['heavy_modules_loaded'])}")
+        if limit is not None and measured["ms"] > limit:
+            failures.append(f"{label} took {measured['ms']}ms, over the {limit}ms budget")
+    return failures
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure UI time to first window and generator import time, and list the slowest imports."
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Keep the best of this many fresh interpreters.")
+    parser.add_argument("--top", type=int, default=15, help="Imports listed in the -X importtime breakdown.")
+    parser.add_argument("--max-first-window-ms", type=float, default=DEFAULT_MAX_FIRST_WINDOW_MS)
+    parser.add_argument("--max-generator-import-ms", type=float, default=DEFAULT_MAX_GENERATOR_IMPORT_MS)
+    parser.add_argument("--output", type=pathlib.Path, default=None, help="Write the results as JSON to this file.")
+    arguments = parser.parse_args(argv)
+    repeat = max(1, arguments.repeat)
+
+    # One untimed run writes the bytecode caches.
+    run_probe(GENERATOR_IMPORT_PROBE)
+    results: Dict[str, Any] = {
+        "benchmark": "startup",
+        "environment": environment(),
+        "first_window": best_probe(FIRST_WINDOW_PROBE, repeat),
+        "generator_import": best_probe(GENERATOR_IMPORT_PROBE, repeat),
+        "import_time": {
+            module: import_time_breakdown(module, arguments.top)
+            for module in ("sprite_rips_to_mm_sprite_resources_ui", "sprite_rips_to_mm_sprite_resources")
+        },
+    }
+    failures = check_budgets(results, arguments)
+    results["failures"] = failures
+
+    for label in ("first_window", "generator_import"):
+        measured = results[label]
+        if "skipped" in measured:
+            print(f"{label:<18} skipped: {measured['skipped']}", file=sys.stderr)
+        else:
+            print(f"{label:<18} {measured['ms']:>8.1f}ms", file=sys.stderr)
+    for module, entries in results["import_time"].items():
+        print(module, file=sys.stderr)
+        for entry in entries:
+            print(f"  {'  ' * entry['depth']}{entry['module']:<40} {entry['cumulative_ms']:>8.2f}ms", file=sys.stderr)
+    text = json.dumps(results, indent=2)
+    print(text)
+    if arguments.output is not None:
+        arguments.output.write_text(text + "\n", encoding="utf-8")
+    for failure in failures:
+        print(f"FAILED: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+import argparse
+import json
+import math
+import pathlib
+import sys
+from dataclasses import asdict, dataclass
+from typing import Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+
+@dataclass
+class SyntheticSubjectSpec:
+    name: str = "Synthetic"
+    frames: int = 60
+    animations: int = 4
+    width: int = 1920
+    height: int = 1080
+    coverage: float = 0.05
+    background_color: str = "#00FF00"
+    background_noise: float = 0.0
+    resize_to_percent: float = 50
+    color_threshold: float = 100
+    is_hd: bool = True
+    seed: int = 0
+
+
+def _parse_hex_color(value: str) -> np.ndarray:
+    text = value.lstrip("#")
+    if len(text) not in (6, 8):
+        raise SystemExit(f"Unsupported background color: {value}")
+    return np.array([int(text[index:index + 2], 16) for index in range(0, 6, 2)], dtype=np.int16)
+
+
+def render_frame(spec: SyntheticSubjectSpec, generator: np.random.Generator, phase: float) -> Image.Image:
+    # An elliptical sprite with a shaded body, a half-transparent rim and a
+    # stripe, drifting across a solid (optionally noisy) backdrop.
+    background = _parse_hex_color(spec.background_color)
+    pixels = np.empty((spec.height, spec.width, 4), dtype=np.uint8)
+    if spec.background_noise > 0:
+        noise = generator.normal(0, spec.background_noise, (spec.height, spec.width, 3))
+        pixels[..., :3] = np.clip(noise + background, 0, 255).astype(np.uint8)
+    else:
+        pixels[..., :3] = background.astype(np.uint8)
+    pixels[..., 3] = 255
+
+    area = max(1.0, spec.coverage * spec.width * spec.height)
+    radius_y = max(1.0, math.sqrt(area / (math.pi * 1.5)))
+    radius_x = min(spec.width / 2, radius_y * 1.5)
+    radius_y = min(spec.height / 2, radius_y)
+    center_x = radius_x + (spec.width - 2 * radius_x) * (0.5 + 0.4 * math.sin(phase))
+    center_y = radius_y + (spec.height - 2 * radius_y) * (0.5 + 0.4 * math.cos(phase * 0.7))
+
+    top = max(0, int(center_y - radius_y))
+    bottom = min(spec.height, int(center_y + radius_y) + 1)
+    left = max(0, int(center_x - radius_x))
+    right = min(spec.width, int(center_x + radius_x) + 1)
+    ys = (np.arange(top, bottom)[:, None] - center_y) / radius_y
+    xs = (np.arange(left, right)[None, :] - center_x) / radius_x
+    distance = xs * xs + ys * ys
+    body = distance <= 1.0
+
+    region = pixels[top:bottom, left:right]
+    shade = (1.0 - np.clip(distance, 0, 1) * 0.6)[..., None]
+    base = np.array([200, 60 + int(80 * (1 + math.sin(phase))), 40], dtype=np.float64)
+    region[body, :3] = (base * shade)[body].astype(np.uint8)
+    region[body & (np.abs(ys) < 0.1), :3] = (240, 240, 240)
+    region[body & (distance > 0.9), 3] = 160
+    return Image.fromarray(pixels, "RGBA")
+
+
+def make_synthetic_subject(root: pathlib.Path, spec: SyntheticSubjectSpec) -> pathlib.Path:
+    # Writes <root>/config.json and <root>/<name>/ with a raw/ tree, so the
+    # generator can be run from <root>. Frames are spread over the
+    # animations as evenly as possible.
+    generator = np.random.default_rng(spec.seed)
+    subject_dir = root / spec.name
+    raw_dir = subject_dir / "raw"
+    raw_dir.mkdir(parents=True, exist_ok=True)
+
+    (root / "config.json").write_text(
+        json.dumps({"game_theme": None, "subject": spec.name, "is_hd": spec.is_hd, "reduce_file_size": False}, indent=2),
+        encoding="utf-8",
+    )
+    (subject_dir / "config.json").write_text(
+        json.dumps(
+            {
+                "resize_to_percent": spec.resize_to_percent,
+                "background_color": spec.background_color,
+                "color_threshold": spec.color_threshold,
+            },
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
+
+    animation_count = max(1, min(spec.animations, spec.frames))
+    frame_number = 0
+    for animation_index in range(animation_count):
+        animation_dir = raw_dir / f"Anim{animation_index:02d}"
+        animation_dir.mkdir(exist_ok=True)
+        (animation_dir / "config.json").write_text(
+            json.dumps({"regenerate": True, "delay": 2, "offset": {"x": 0, "y": 0}}, indent=2),
+            encoding="utf-8",
+        )
+        frame_count = spec.frames // animation_count + (1 if animation_index < spec.frames % animation_count else 0)
+        for frame_index in range(frame_count):
+            frame = render_frame(spec, generator, frame_number * 0.37)
+            frame.save(animation_dir / f"frame{frame_index:04d}.png", compress_level=1)
+            frame_number += 1
+
+    (root / "synthetic_subject.json").write_text(json.dumps(asdict(spec), indent=2), encoding="utf-8")
+    return subject_dir
+
+
+def add_spec_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = SyntheticSubjectSpec()
+    parser.add_argument("--name", default=defaults.name)
+    parser.add_argument("--frames", type=int, default=defaults.frames)
+    parser.add_argument("--animations", type=int, default=defaults.animations)
+    parser.add_argument("--width", type=int, default=defaults.width)
+    parser.add_argument("--height", type=int, default=defaults.height)
+    parser.add_argument("--coverage", type=float, default=defaults.coverage, help="Share of the frame covered by the sprite.")
+    parser.add_argument("--background-color", default=defaults.background_color)
+    parser.add_argument("--background-noise", type=float, default=defaults.background_noise, help="Standard deviation of the backdrop noise.")
+    parser.add_argument("--resize", type=float, default=defaults.resize_to_percent, dest="resize_to_percent")
+    parser.add_argument("--color-threshold", type=float, default=defaults.color_threshold)
+    parser.add_argument("--sd", action="store_true", help="Generate a non-HD subject.")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def spec_from_arguments(arguments: argparse.Namespace) -> SyntheticSubjectSpec:
+    return SyntheticSubjectSpec(
+        name=arguments.name,
+        frames=arguments.frames,
+        animations=arguments.animations,
+        width=arguments.width,
+        height=arguments.height,
+        coverage=arguments.coverage,
+        background_color=arguments.background_color,
+        background_noise=arguments.background_noise,
+        resize_to_percent=arguments.resize_to_percent,
+        color_threshold=arguments.color_threshold,
+        is_hd=not arguments.sd,
+        seed=arguments.seed,
+    )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Write a synthetic subject with a raw/ tree for benchmarking.")
+    parser.add_argument("root", type=pathlib.Path, help="Folder to write the subject and its root config.json into.")
+    add_spec_arguments(parser)
+    arguments = parser.parse_args(argv)
+    subject_dir = make_synthetic_subject(arguments.root, spec_from_arguments(arguments))
+    print(subject_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
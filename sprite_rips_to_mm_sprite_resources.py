@@ -1,26 +1,79 @@
+from __future__ import annotations
+
+import argparse
+import bisect
+import functools
+import hashlib
+import importlib
+import importlib.util
 import json
 import math
+import multiprocessing
+import os
 import pathlib
 import shutil
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from collections import deque
 from collections.abc import Sequence
-from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
 from dataclasses import dataclass
-import numpy as np
 import copy
 
-try:
-    from PIL import Image
-except ImportError as exc:
-    raise SystemExit("Pillow is required to run this script. Install it with `pip install pillow`.") from exc
+from sprite_rips_to_mm_sprite_resources_subjects import is_subject_directory_name
 
-try:
-    RESAMPLE_NEAREST = Image.Resampling.NEAREST
-except AttributeError:
-    RESAMPLE_NEAREST = Image.NEAREST
+
+class _DeferredModule:
+    # Stands in for numpy and Pillow until one of their attributes is first
+    # used, then imports the module and replaces itself in this module's
+    # globals. Importing this module (the UI does) stays cheap that way.
+
+    def __init__(self, module_name: str, global_name: str) -> None:
+        self._module_name = module_name
+        self._global_name = global_name
+
+    def __getattr__(self, attribute: str) -> Any:
+        module = importlib.import_module(self._module_name)
+        globals()[self._global_name] = module
+        return getattr(module, attribute)
+
+
+if importlib.util.find_spec("PIL") is None:
+    raise SystemExit("Pillow is required to run this script. Install it with `pip install pillow`.")
+
+np = _DeferredModule("numpy", "np")
+Image = _DeferredModule("PIL.Image", "Image")
+PngImagePlugin = _DeferredModule("PIL.PngImagePlugin", "PngImagePlugin")
+
+# Image.Resampling.NEAREST (Image.NEAREST before Pillow 9.1); every Pillow
+# version accepts the plain value.
+RESAMPLE_NEAREST = 0
 
 SUPPORTED_EXTENSIONS = {".png"}
+# Processed frames kept under generated/<Animation>/ for load_existing_sprites.
+INTERMEDIATE_EXTENSIONS = {".png", ".npy"}
+FRAME_OUTPUT_MODES = ("async", "png", "npy", "none")
+# Where animations with regenerate: false get their pixels: their frame files
+# under generated/<Animation>/, or their Rects in the previous sheet.
+PRESERVE_SOURCES = ("frames", "sheet")
 LAYOUT_GAP = 2
 CONFIG_PATH = "config.json"
+FRAME_CACHE_VERSION = 1
+# Raw frames decoded by DecodedFrameCache, under the subject folder.
+DECODED_FRAME_DIR = ".decoded"
+DEFAULT_FRAME_CACHE_SIZE_MB = 1024
+SHEET_MODES = ("memory", "stream", "auto")
+DEFAULT_BAND_HEIGHT = 256
+DEFAULT_MEMORY_BUDGET_MB = 2048
+WATCH_POLL_SECONDS = 0.5
+DEFAULT_WATCH_DEBOUNCE_SECONDS = 1.0
+PNG_IDAT_CHUNK_SIZE = 1 << 16
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
 GAME_THEME_CONFIG_FILENAME = "config.json"
 
 DEFAULT_MAIN_CONFIG: Dict[str, Any] = {
@@ -40,9 +93,12 @@ DEFAULT_SUBJECT_CONFIG: Dict[str, Any] = {
     "color_threshold": 100,
     "remove_background": True,
     "crop_sprites": True,
+    "deduplicate_frames": False,
+    "duplicate_tolerance": 0,
     "sheet": {
         "width": None,
-        "height": None
+        "height": None,
+        "packer": "shelf"
     }
 }
 
@@ -59,6 +115,32 @@ DEFAULT_ANIMATION_CONFIG: Dict[str, Any] = {
     }
 }
 
+class GeneratorError(Exception):
+    # Base of the errors generation reports. The command line prints the
+    # message and exits; library callers can catch the subclasses.
+    pass
+
+
+class ConfigError(GeneratorError):
+    pass
+
+
+class InputError(GeneratorError):
+    pass
+
+
+class LayoutError(GeneratorError):
+    pass
+
+
+class OutputError(GeneratorError):
+    pass
+
+
+class GenerationCancelled(GeneratorError):
+    pass
+
+
 @dataclass
 class SubjectConfig:
     resize_to_percent: float
@@ -67,6 +149,9 @@ class SubjectConfig:
     remove_background: bool
     crop_sprites: bool
     sheet_dimensions: Tuple[Optional[int], Optional[int]]
+    sheet_packer: str = "shelf"
+    deduplicate_frames: bool = False
+    duplicate_tolerance: float = 0
 
 @dataclass
 class AnimationConfig:
@@ -106,11 +191,14 @@ def deep_merge(base: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any
 def load_config(path: pathlib.Path) -> Dict[str, Any]:
     if path.exists() and path.stat().st_size > 0:
         with path.open("r", encoding="utf-8") as handle:
-            overrides = json.load(handle)
+            try:
+                overrides = json.load(handle)
+            except json.JSONDecodeError as exc:
+                raise ConfigError(f"Config file {path} is not valid JSON: {exc}") from exc
         if not isinstance(overrides, dict):
-            raise SystemExit(f"Config file {path} must contain a JSON object.")
+            raise ConfigError(f"Config file {path} must contain a JSON object.")
     else:
-        raise SystemExit(f"Config file {path} does not exists or is empty.")
+        raise ConfigError(f"Config file {path} does not exists or is empty.")
     return overrides
 
 
@@ -134,7 +222,7 @@ def parse_rgba_color(value: Optional[Any]) -> Optional[Tuple[int, int, int, int]
             b = int(trimmed[4:6], 16)
             a = int(trimmed[6:8], 16)
             return (r, g, b, a)
-        raise SystemExit(f"Unsupported color value: {value}")
+        raise ConfigError(f"Unsupported color value: {value}")
     if isinstance(value, Sequence):
         if len(value) == 3:
             r, g, b = value
@@ -142,41 +230,113 @@ def parse_rgba_color(value: Optional[Any]) -> Optional[Tuple[int, int, int, int]
         if len(value) == 4:
             r, g, b, a = value
             return (int(r), int(g), int(b), int(a))
-    raise SystemExit(f"Unsupported color value: {value}")
+    raise ConfigError(f"Unsupported color value: {value}")
 
 
 
-def resize_image(image: Image.Image, percent: float) -> Image.Image:
+def resized_dimensions(size: Tuple[int, int], percent: float) -> Tuple[int, int]:
     scale = percent / 100.0
     if scale <= 0:
-        raise SystemExit("resize_to_percent must be greater than zero.")
-    new_width = max(1, int(round(image.width * scale)))
-    new_height = max(1, int(round(image.height * scale)))
+        raise ConfigError("resize_to_percent must be greater than zero.")
+    return max(1, int(round(size[0] * scale))), max(1, int(round(size[1] * scale)))
+
+
+def resize_image(image: Image.Image, percent: float) -> Image.Image:
+    new_width, new_height = resized_dimensions(image.size, percent)
     if new_width == image.width and new_height == image.height:
         return image
     return image.resize((new_width, new_height), RESAMPLE_NEAREST)
 
 
-def remove_color_with_threshold(image: Image.Image, target_color: Tuple[int, int, int, int], threshold: float, reduce_file_size) -> Image.Image:
-    im = image.convert("RGBA")
-    arr = np.asarray(im).copy()        
-    rgb = arr[..., :3].astype(np.int32)   
-    alpha = arr[..., 3]
+@functools.lru_cache(maxsize=64)
+def _nearest_source_indices(source_length: int, target_length: int) -> np.ndarray:
+    # Source index Pillow's NEAREST resize samples for every target index. It
+    # is taken from Pillow itself so sampling with it matches resize() exactly.
+    ramp = Image.fromarray(np.arange(source_length, dtype=np.int32)[None, :], "I")
+    indices = np.asarray(ramp.resize((target_length, 1), RESAMPLE_NEAREST))[0].astype(np.intp)
+    indices.setflags(write=False)
+    return indices
+
+
+def _within_color_distance(pixels: np.ndarray, target: Sequence[int], threshold: float) -> np.ndarray:
+    # Squared Euclidean distance test without widening the frame to int32.
+    # Differences are taken in wrapping uint16: squaring a wrapped difference
+    # still gives the exact square since it never exceeds 255 * 255. Each
+    # square is capped at thr2 + 1, which keeps the sum in uint16 for the
+    # usual thresholds without changing which pixels pass; larger thresholds
+    # sum in uint32.
+    height, width, channel_count = pixels.shape
+    thr2 = int(threshold * threshold)
+    if thr2 >= 255 * 255 * channel_count:
+        return np.ones((height, width), dtype=bool)
+    cap = thr2 + 1
+    sum_dtype = np.uint16 if cap * channel_count <= 0xFFFF else np.uint32
+
+    square = np.empty((height, width), dtype=sum_dtype)
+    total = np.zeros((height, width), dtype=sum_dtype)
+    for channel_index in range(channel_count):
+        np.copyto(square, pixels[..., channel_index])
+        np.subtract(square, sum_dtype(int(target[channel_index])), out=square)
+        np.multiply(square, square, out=square)
+        if sum_dtype is np.uint16:
+            np.minimum(square, cap, out=square)
+        total += square
+    return total <= thr2
+
+
+def _bbox_from_hits(rows: np.ndarray, cols: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    if not rows.any():
+        return None
+    top = int(np.argmax(rows))
+    bottom = int(len(rows) - np.argmax(rows[::-1]))
+    left = int(np.argmax(cols))
+    right = int(len(cols) - np.argmax(cols[::-1]))
+    return left, top, right, bottom
 
-    tr, tg, tb, _ = target_color
-    diff = rgb - np.array([tr, tg, tb], dtype=np.int32)
-    dist2 = (diff * diff).sum(axis=2)        
 
-    thr2 = int(threshold * threshold)
-    mask = (alpha != 0) & (dist2 <= thr2)
+def _mask_bbox(mask: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    return _bbox_from_hits(mask.any(axis=1), mask.any(axis=0))
 
+
+def _keyed_pixels(
+    image: Image.Image,
+    target_color: Tuple[int, int, int, int],
+    threshold: float,
+    reduce_file_size
+) -> np.ndarray:
+    # Keys a single private RGBA copy of the frame in place.
+    arr = np.array(image if image.mode == "RGBA" else image.convert("RGBA"))
+    alpha = arr[..., 3]
+    keyed = _within_color_distance(arr[..., :3], target_color[:3], threshold)
+    np.logical_and(keyed, alpha != 0, out=keyed)
     if not reduce_file_size:
-        arr[mask, 3] = 0    
+        alpha[keyed] = 0
     else:
-        arr[mask] = 0     
+        arr[keyed] = 0
+    return arr
 
+
+def remove_color_with_threshold(image: Image.Image, target_color: Tuple[int, int, int, int], threshold: float, reduce_file_size) -> Image.Image:
+    arr = _keyed_pixels(image, target_color, threshold, reduce_file_size)
     return Image.fromarray(arr, "RGBA")
 
+
+def remove_color_and_trim(
+    image: Image.Image,
+    target_color: Tuple[int, int, int, int],
+    threshold: float,
+    reduce_file_size,
+    is_hd: bool
+) -> Tuple[Image.Image, Tuple[int, int]]:
+    # remove_color_with_threshold followed by a transparent trim_color, in
+    # one pass: the trim box comes straight from the key mask.
+    arr = _keyed_pixels(image, target_color, threshold, reduce_file_size)
+    keyed_image = Image.fromarray(arr, "RGBA")
+    bbox = _mask_bbox(arr[..., 3] != 0)
+    if bbox is None:
+        return keyed_image, (0, 0)
+    return _crop_to_bbox(keyed_image, keyed_image, bbox, is_hd)
+
 def _align_even_box(left: int, top: int, right: int, bottom: int,
                     w: int, h: int) -> Tuple[int,int,int,int]:
 
@@ -194,9 +354,26 @@ def _align_even_box(left: int, top: int, right: int, bottom: int,
 
     return left_aligned, top_aligned, right_aligned, bottom_aligned
 
+def _crop_to_bbox(
+    image: Image.Image,
+    img: Image.Image,
+    bbox: Tuple[int, int, int, int],
+    is_hd: bool
+) -> Tuple[Image.Image, Tuple[int, int]]:
+    w, h = img.size
+    left, top, right, bottom = bbox
+    if is_hd:
+        left, top, right, bottom = _align_even_box(left, top, right, bottom, w, h)
+
+    if left == 0 and top == 0 and right == w and bottom == h:
+        return image, (0, 0)
+
+    cropped = img.crop((left, top, right, bottom))
+    return cropped, (left, top)
+
+
 def trim_color(image: Image.Image, trim_color: Optional[Tuple[int, int, int, int]], threshold: float, is_hd: bool) -> Tuple[Image.Image, Tuple[int, int]]:
     img = image if image.mode == "RGBA" else image.convert("RGBA")
-    w, h = img.size
 
     tr, tg, tb, ta = (int(c) for c in trim_color[:4])
 
@@ -204,45 +381,69 @@ def trim_color(image: Image.Image, trim_color: Optional[Tuple[int, int, int, int
    
         alpha = img.getchannel("A")
         bbox = alpha.getbbox()
-        if not bbox:
-            return image, (0, 0)
-        left, top, right, bottom = bbox
     else:
         arr = np.asarray(img, dtype=np.uint8)
-        r = arr[..., 0].astype(np.int32)
-        g = arr[..., 1].astype(np.int32)
-        b = arr[..., 2].astype(np.int32)
-        a = arr[..., 3]
-
-        dr = r - tr
-        dg = g - tg
-        db = b - tb
-        da = a.astype(np.int32) - ta
-
-        dist2 = dr*dr + dg*dg + db*db + da*da
-        thr2 = int(threshold * threshold)
-
-        neq = dist2 > thr2
+        neq = _within_color_distance(arr, (tr, tg, tb, ta), threshold)
+        np.logical_not(neq, out=neq)
+        bbox = _mask_bbox(neq)
 
-        if not np.any(neq):
-            return image, (0, 0)
-
-        rows = np.any(neq, axis=1)
-        cols = np.any(neq, axis=0)
+    if not bbox:
+        return image, (0, 0)
+    return _crop_to_bbox(image, img, bbox, is_hd)
 
-        top = int(np.argmax(rows))
-        bottom = int(h - np.argmax(rows[::-1]))
-        left = int(np.argmax(cols))
-        right = int(w - np.argmax(cols[::-1]))
 
-    if is_hd:
-        left, top, right, bottom = _align_even_box(left, top, right, bottom, w, h)
+def resize_and_trim(
+    image: Image.Image,
+    percent: float,
+    key_color: Optional[Tuple[int, int, int, int]],
+    trim_color_value: Optional[Tuple[int, int, int, int]],
+    threshold: float,
+    reduce_file_size,
+    is_hd: bool
+) -> Tuple[Image.Image, Tuple[int, int], Tuple[int, int]]:
+    # Same result as keying with key_color (when given), resize_image and
+    # trim_color in that order. Nearest-neighbour resizing only copies source
+    # pixels and keying looks at one pixel at a time, so the steps commute:
+    # shrinking frames are sampled first and only the sampled pixels are
+    # keyed; growing frames sample every source row and column, so the trim
+    # box comes from the source mask and only the trimmed region is
+    # resampled. Returns the trimmed frame, its offset and the size of the
+    # resized frame.
+    width, height = image.size
+    new_width, new_height = resized_dimensions(image.size, percent)
+    if new_width < width or new_height < height:
+        resized = resize_image(image, percent)
+        if key_color is not None:
+            trimmed, trim_offset = remove_color_and_trim(resized, key_color, threshold, reduce_file_size, is_hd)
+        else:
+            trimmed, trim_offset = trim_color(resized, trim_color_value, threshold, is_hd)
+        return trimmed, trim_offset, resized.size
 
-    if left == 0 and top == 0 and right == w and bottom == h:
-        return image, (0, 0)
+    if key_color is not None:
+        pixels = _keyed_pixels(image, key_color, threshold, reduce_file_size)
+    else:
+        pixels = np.ascontiguousarray(np.asarray(image if image.mode == "RGBA" else image.convert("RGBA")))
+    if int(trim_color_value[3]) == 0:
+        visible = pixels[..., 3] != 0
+    else:
+        visible = _within_color_distance(pixels, trim_color_value[:4], threshold)
+        np.logical_not(visible, out=visible)
+
+    rows = _nearest_source_indices(height, new_height)
+    cols = _nearest_source_indices(width, new_width)
+    bbox = _bbox_from_hits(visible.any(axis=1)[rows], visible.any(axis=0)[cols])
+    if bbox is None:
+        left, top, right, bottom = 0, 0, new_width, new_height
+    else:
+        left, top, right, bottom = bbox
+        if is_hd:
+            left, top, right, bottom = _align_even_box(left, top, right, bottom, new_width, new_height)
 
-    cropped = img.crop((left, top, right, bottom))
-    return cropped, (left, top)
+    # One uint32 per pixel keeps the gathers to a single element each.
+    packed = pixels.view(np.uint32)[..., 0]
+    trimmed = packed.take(rows[top:bottom], axis=0).take(cols[left:right], axis=1)
+    trim_offset = (0, 0) if (left, top, right, bottom) == (0, 0, new_width, new_height) else (left, top)
+    return Image.fromarray(trimmed.view(np.uint8).reshape(bottom - top, right - left, 4), "RGBA"), trim_offset, (new_width, new_height)
 
 
 def ensure_even_dimensions(image: Image.Image) -> Image.Image:
@@ -305,12 +506,12 @@ def load_animation_config(animation_dir: pathlib.Path, is_hd) -> AnimationConfig
         try:
             scaled = value * 2
         except TypeError as exc:
-            raise SystemExit(f"Invalid offset value in {config_path}: {value!r}") from exc
+            raise ConfigError(f"Invalid offset value in {config_path}: {value!r}") from exc
         
         try:
             return float(scaled)
         except (TypeError, ValueError) as exc:
-            raise SystemExit(f"Invalid offset value in {config_path}: {value!r}") from exc
+            raise ConfigError(f"Invalid offset value in {config_path}: {value!r}") from exc
 
     offset = (raw_x, raw_y)
     if is_hd:
@@ -399,97 +600,1034 @@ def load_previous_sprite_metadata(path: pathlib.Path, preserve_dirs: set) -> Pre
     return PreviousSpriteFileValues(previous_frame_values, root_sub_positions_str)
 
 
+class PixelArena:
+    # Contiguous RGBA pixels of the cropped frames of one animation, sized up
+    # front. Frames are appended once and addressed by byte offset and size;
+    # image() wraps the arena's memory instead of copying it.
+    __slots__ = ("_pixels", "_end")
+    composited = False
+
+    def __init__(self, capacity: int) -> None:
+        self._pixels = np.empty(capacity, dtype=np.uint8)
+        self._end = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._pixels.nbytes
+
+    def append(self, image: Image.Image) -> int:
+        if image.mode != "RGBA":
+            image = image.convert("RGBA")
+        offset = self._end
+        end = offset + image.width * image.height * 4
+        self._pixels[offset:end] = np.frombuffer(image.tobytes(), dtype=np.uint8)
+        self._end = end
+        return offset
+
+    def pixels(self, offset: int, size: Tuple[int, int]) -> np.ndarray:
+        return self._pixels[offset:offset + size[0] * size[1] * 4]
+
+    def image(self, offset: int, size: Tuple[int, int]) -> Image.Image:
+        if size[0] * size[1] == 0:
+            return Image.new("RGBA", size)
+        return Image.frombuffer("RGBA", size, self.pixels(offset, size), "raw", "RGBA", 0, 1)
+
+
+class SpriteRecord:
+    # One frame on its way to the sheet. Layout and metadata export read only
+    # these fields; the pixels stay in a PixelArena (or a FrameSpillStore once
+    # spilled) at arena_offset.
+    __slots__ = (
+        "width",
+        "height",
+        "trim_offset",
+        "original_size",
+        "offset",
+        "recover_cropped_offset",
+        "arena",
+        "arena_offset",
+        "old_frame_json",
+    )
+
+    def __init__(
+        self,
+        size: Tuple[int, int],
+        trim_offset: Tuple[int, int],
+        original_size: Tuple[int, int],
+        offset: Tuple[float, float],
+        recover_cropped_offset: Tuple[bool, bool],
+        arena: Any = None,
+        arena_offset: int = 0,
+        old_frame_json: Optional[Dict[str, Any]] = None
+    ) -> None:
+        self.width, self.height = size
+        self.trim_offset = trim_offset
+        self.original_size = original_size
+        self.offset = offset
+        self.recover_cropped_offset = recover_cropped_offset
+        self.arena = arena
+        self.arena_offset = arena_offset
+        self.old_frame_json = old_frame_json
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return (self.width, self.height)
+
+    def pixels(self) -> np.ndarray:
+        return self.arena.pixels(self.arena_offset, self.size)
+
+    def image(self) -> Image.Image:
+        return self.arena.image(self.arena_offset, self.size)
+
+
+class FrameFileArena:
+    # Stands in for a PixelArena over frame files on disk. Records address a
+    # file by its index, and its pixels are decoded only when asked for.
+    __slots__ = ("paths",)
+    composited = False
+
+    def __init__(self, paths: Sequence[pathlib.Path]) -> None:
+        self.paths = list(paths)
+
+    def pixels(self, offset: int, size: Tuple[int, int]) -> np.ndarray:
+        return np.asarray(self.image(offset, size)).reshape(-1)
+
+    def image(self, offset: int, size: Tuple[int, int]) -> Image.Image:
+        image = read_intermediate_frame(self.paths[offset])
+        if image.size != tuple(size):
+            raise InputError(f"{self.paths[offset]} changed size while generating.")
+        return image
+
+
+class SheetSliceArena:
+    # Stands in for a PixelArena over the previous full-size sheet. Records
+    # address a Rect by index; the sheet is decoded once, on first use. Its
+    # pixels were already pasted through their own alpha, so they go onto the
+    # new sheet without a mask.
+    __slots__ = ("path", "size", "origins", "_sheet")
+    composited = True
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self.size = read_frame_size(path)
+        self.origins: List[Tuple[int, int]] = []
+        self._sheet: Optional[Image.Image] = None
+
+    def add(self, left: int, top: int) -> int:
+        self.origins.append((left, top))
+        return len(self.origins) - 1
+
+    def pixels(self, offset: int, size: Tuple[int, int]) -> np.ndarray:
+        return np.asarray(self.image(offset, size)).reshape(-1)
+
+    def image(self, offset: int, size: Tuple[int, int]) -> Image.Image:
+        if self._sheet is None:
+            with Image.open(self.path) as source_image:
+                self._sheet = source_image.convert("RGBA")
+        left, top = self.origins[offset]
+        return self._sheet.crop((left, top, left + size[0], top + size[1]))
+
+
+def read_frame_size(path: pathlib.Path) -> Tuple[int, int]:
+    # Width and height from the PNG IHDR chunk (or the .npy header) without
+    # decoding any pixels.
+    if path.suffix.lower() == ".npy":
+        height, width = np.load(path, mmap_mode="r").shape[:2]
+        return width, height
+    with path.open("rb") as handle:
+        header = handle.read(24)
+    if len(header) < 24 or header[:8] != PNG_SIGNATURE or header[12:16] != b"IHDR":
+        raise InputError(f"{path} is not a PNG file.")
+    width, height = struct.unpack(">II", header[16:24])
+    return width, height
+
+
+def build_sprite_records(
+    frames: Sequence[Tuple[Image.Image, Tuple[int, int], Tuple[int, int]]],
+    offset: Tuple[float, float],
+    recover_cropped_offset: Tuple[bool, bool],
+    old_frame_values: Optional[Sequence[Dict[str, Any]]] = None
+) -> List[SpriteRecord]:
+    # Moves the (image, trim_offset, original_size) frames of one animation
+    # into a single arena.
+    arena = PixelArena(sum(image.width * image.height * 4 for image, _, _ in frames))
+    records = []
+    for index, (image, trim_offset, original_size) in enumerate(frames):
+        records.append(SpriteRecord(
+            image.size,
+            trim_offset,
+            original_size,
+            offset,
+            recover_cropped_offset,
+            arena,
+            arena.append(image),
+            old_frame_values[index] if old_frame_values is not None else None,
+        ))
+    return records
+
+
 def load_existing_sprites(
     target_dir: pathlib.Path,
     previous_frame_values: Any,
     animation_config : AnimationConfig
-) -> Optional[List[Dict[str, Any]]]:
+) -> Optional[List[SpriteRecord]]:
     if not target_dir.exists() or not target_dir.is_dir():
         return None
 
-    sprite_paths = sorted(
-        path for path in target_dir.iterdir()
-        if path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS
-    )
+    sprite_paths = collect_intermediate_frame_paths(target_dir)
     if not sprite_paths:
         return None
 
-    sprites: List[Dict[str, Any]] = []
-    for idx, sprite_path in enumerate(sprite_paths):
-        with Image.open(sprite_path) as source_image:
-            image = source_image.convert("RGBA")
+    # Only the headers are read here; each frame is decoded when it is pasted.
+    arena = FrameFileArena(sprite_paths)
+    sprites: List[SpriteRecord] = []
+    for index, sprite_path in enumerate(sprite_paths):
+        size = read_frame_size(sprite_path)
+        sprites.append(SpriteRecord(
+            size,
+            (0, 0),
+            size,
+            animation_config.offset,
+            (False, False),
+            arena,
+            index,
+            previous_frame_values[index] if previous_frame_values is not None else None,
+        ))
+    return sprites
 
-        sprite_dict = {
-            "image": image,
-            "recover_cropped_offset": (False, False),
-            "original_size": image.size,
-            "offset": animation_config.offset,
-            "trim_offset": (0, 0)
-        }
-       
-        if previous_frame_values != None:
-            sprite_dict["old_frame_json"] = previous_frame_values[idx]
 
-        sprites.append(sprite_dict)
-    
+def load_sheet_sprites(
+    arena: SheetSliceArena,
+    previous_frame_values: Sequence[Dict[str, Any]],
+    animation_config: AnimationConfig,
+    is_hd: bool
+) -> List[SpriteRecord]:
+    # Slices the frames of one preserved animation out of the previous sheet
+    # by the Rects its .sprite entries were written with (halved when HD).
+    scale = 2 if is_hd else 1
+    sheet_width, sheet_height = arena.size
+    sprites: List[SpriteRecord] = []
+    for frame_json in previous_frame_values:
+        try:
+            left, top, right, bottom = (int(value) * scale for value in frame_json["Rect"].split())
+        except (KeyError, AttributeError, ValueError) as exc:
+            raise InputError(f"Unreadable Rect in the previous .sprite file: {frame_json.get('Rect')!r}") from exc
+        if not (0 <= left < right <= sheet_width and 0 <= top < bottom <= sheet_height):
+            raise InputError(f"Rect {frame_json['Rect']} lies outside the previous sheet {arena.path}.")
+        size = (right - left, bottom - top)
+        sprites.append(SpriteRecord(
+            size,
+            (0, 0),
+            size,
+            animation_config.offset,
+            (False, False),
+            arena,
+            arena.add(left, top),
+            frame_json,
+        ))
     return sprites
 
+
 def collect_sprite_paths(directory: pathlib.Path) -> List[pathlib.Path]:
     return [p for p in sorted(directory.iterdir()) if p.is_file() and p.suffix.lower() in SUPPORTED_EXTENSIONS]
 
 
-def process_sprites(
-    sprite_paths: Sequence[pathlib.Path],
-    output_dir: pathlib.Path,
-    reduce_file_size: bool,
-    subject_config: SubjectConfig,
-    animation_config: AnimationConfig,
-    is_hd: bool
-) -> List[Dict[str, Any]]:
-    processed: List[Dict[str, Any]] = []
-    output_dir.mkdir(parents=True, exist_ok=True)
+def collect_intermediate_frame_paths(directory: pathlib.Path) -> List[pathlib.Path]:
+    return [p for p in sorted(directory.iterdir()) if p.is_file() and p.suffix.lower() in INTERMEDIATE_EXTENSIONS]
 
-    for sprite_path in sprite_paths:
-        with Image.open(sprite_path) as source_image:
-            image = source_image.convert("RGBA")
 
-        can_remove_color = subject_config.background_color is not None and subject_config.remove_background
+def read_intermediate_frame(path: pathlib.Path) -> Image.Image:
+    if path.suffix.lower() == ".npy":
+        return Image.fromarray(np.load(path), "RGBA")
+    with Image.open(path) as source_image:
+        return source_image.convert("RGBA")
+
+
+def write_intermediate_frame(image: Image.Image, output_dir: pathlib.Path, stem: str, mode: str) -> Optional[pathlib.Path]:
+    # No optimize pass: these files are only read back by load_existing_sprites.
+    if mode == "none":
+        return None
+    if mode == "npy":
+        path = output_dir / f"{stem}.npy"
+        np.save(path, np.asarray(image if image.mode == "RGBA" else image.convert("RGBA")))
+        return path
+    path = output_dir / f"{stem}.png"
+    image.save(path, format="PNG", compress_level=0)
+    return path
+
+
+class FrameWriter:
+    # Writes the intermediate frames of one generate run. In "async" mode the
+    # PNG encodes and disk writes run on a small thread pool, at most
+    # max_pending at a time; close() waits for them and re-raises the first
+    # failure. The other modes write (or skip) synchronously.
+
+    def __init__(self, mode: str, max_pending: int = 32) -> None:
+        if mode not in FRAME_OUTPUT_MODES:
+            raise ConfigError(f"Unsupported frame output mode: {mode}")
+        self.mode = mode
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._error: Optional[BaseException] = None
+        if mode == "async":
+            self._executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="frame-writer")
+
+    @property
+    def worker_mode(self) -> str:
+        # Mode used inside frame worker processes, which are already off the main loop.
+        return "png" if self.mode == "async" else self.mode
+
+    def write(self, image: Image.Image, output_dir: pathlib.Path, stem: str) -> Optional[pathlib.Path]:
+        # Returns the path when the file was written before returning.
+        if self._executor is None:
+            return write_intermediate_frame(image, output_dir, stem, self.mode)
+        if self._error is not None:
+            self.close()
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(write_intermediate_frame, image, output_dir, stem, "png")
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._finished)
+        return None
+
+    def _finished(self, future: Future) -> None:
+        self._slots.release()
+        if self._error is None and not future.cancelled() and future.exception() is not None:
+            self._error = future.exception()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise OutputError(f"Failed to write an intermediate frame: {error}") from error
+
+
+def process_sprite_image(
+    image: Image.Image,
+    subject_config: SubjectConfig,
+    is_hd: bool,
+    reduce_file_size: bool
+) -> Tuple[Image.Image, Tuple[int, int], Tuple[int, int]]:
+    can_remove_color = subject_config.background_color is not None and subject_config.remove_background
+    needs_resize = not (subject_config.resize_to_percent == 100 or subject_config.resize_to_percent == None)
+    crop_bg = (0, 0, 0, 0) if can_remove_color else subject_config.background_color
+    trim_offset = (0, 0)
+    if subject_config.crop_sprites and needs_resize:
+        image, trim_offset, original_size = resize_and_trim(
+            image,
+            subject_config.resize_to_percent,
+            subject_config.background_color if can_remove_color else None,
+            crop_bg,
+            subject_config.color_threshold,
+            reduce_file_size,
+            is_hd
+        )
+    elif subject_config.crop_sprites and can_remove_color:
+        original_size = image.size
+        image, trim_offset = remove_color_and_trim(
+            image, subject_config.background_color, subject_config.color_threshold, reduce_file_size, is_hd
+        )
+    else:
         if can_remove_color:
             image = remove_color_with_threshold(
                 image, subject_config.background_color, subject_config.color_threshold, reduce_file_size
             )
 
-        if not (subject_config.resize_to_percent == 100 or subject_config.resize_to_percent == None):
+        if needs_resize:
             image = resize_image(image, subject_config.resize_to_percent)
         original_size = image.size
 
-
-        trim_offset = (0, 0)
-        crop_bg = (0, 0, 0, 0) if can_remove_color else subject_config.background_color
         if subject_config.crop_sprites:
             image, trim_offset = trim_color(image, crop_bg, subject_config.color_threshold, is_hd)
 
-        if is_hd:
-            image = ensure_even_dimensions(image)
+    if is_hd:
+        image = ensure_even_dimensions(image)
 
+    return image, trim_offset, original_size
 
-        output_path = output_dir / f"{sprite_path.stem}.png"
-        image.save(output_path, format="PNG", optimize=reduce_file_size, compress_level=0)
 
+class ProfileSpan:
+
+    def __init__(self, profiler: "StageProfiler", name: str, args: Dict[str, Any]) -> None:
+        self._profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self) -> "ProfileSpan":
+        self._start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        self._profiler.record(
+            self.name, self._start, time.perf_counter(), time.thread_time() - self._cpu_start, self.args
+        )
+        return False
+
+    def add(self, counter: str, amount: int) -> None:
+        self.args[counter] = self.args.get(counter, 0) + amount
+
+
+class _NullSpan:
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        return False
+
+    def add(self, counter: str, amount: int) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class NullProfiler:
+    # Stands in when profiling is off: every span is the same no-op object.
+    enabled = False
+
+    def stage(self, name: str, **args: Any) -> _NullSpan:
+        return _NULL_SPAN
+
+    def record(self, name: str, start: float, end: float, cpu_seconds: float, args: Dict[str, Any], pid: Optional[int] = None) -> None:
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+PROFILE_COUNTERS = ("pixels", "bytes_read", "bytes_written")
+
+
+class StageProfiler:
+    # Records wall time, CPU time and pixel/byte counters of nested spans.
+    # Frames processed by worker processes report their own spans, which works
+    # because perf_counter is a system-wide monotonic clock.
+    enabled = True
+
+    def __init__(self) -> None:
+        self.events: List[Dict[str, Any]] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def stage(self, name: str, **args: Any) -> ProfileSpan:
+        return ProfileSpan(self, name, args)
+
+    def record(self, name: str, start: float, end: float, cpu_seconds: float, args: Dict[str, Any], pid: Optional[int] = None) -> None:
+        event = {
+            "name": name,
+            "start": start,
+            "wall_seconds": end - start,
+            "cpu_seconds": cpu_seconds,
+            "pid": os.getpid() if pid is None else pid,
+            "tid": threading.get_ident() if pid is None else 0,
+            "args": args,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def add_events(self, events: Sequence[Dict[str, Any]]) -> None:
+        # Spans recorded by another process's profiler.
+        with self._lock:
+            self.events.extend(events)
+
+    def summary(self) -> Dict[str, Any]:
+        stages: Dict[str, Dict[str, Any]] = {}
+        animations: Dict[str, Dict[str, Any]] = {}
+        frames: List[Dict[str, Any]] = []
+        events = sorted(self.events, key=lambda item: item["start"])
+        # Animations are keyed by the subject whose span encloses them, so a
+        # batch of subjects sharing animation names stays apart. Subjects built
+        # side by side in their own processes are told apart by pid.
+        subject_spans = [event for event in events if event["name"] == "generate_subject" and "subject" in event["args"]]
+        subject_starts = [event["start"] for event in subject_spans]
+        spans_by_pid: Dict[int, Tuple[List[Dict[str, Any]], List[float]]] = {}
+        for event in subject_spans:
+            pid_spans, pid_starts = spans_by_pid.setdefault(event["pid"], ([], []))
+            pid_spans.append(event)
+            pid_starts.append(event["start"])
+        for event in events:
+            name = event["name"]
+            totals = stages.setdefault(name, {"count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0})
+            totals["count"] += 1
+            totals["wall_seconds"] += event["wall_seconds"]
+            totals["cpu_seconds"] += event["cpu_seconds"]
+            for counter in PROFILE_COUNTERS:
+                if counter in event["args"]:
+                    totals[counter] = totals.get(counter, 0) + event["args"][counter]
+
+            animation = event["args"].get("animation")
+            if animation is None or name not in ("animation", "frame"):
+                continue
+            candidates, starts = spans_by_pid.get(event["pid"], (subject_spans, subject_starts))
+            enclosing = bisect.bisect_right(starts, event["start"]) - 1
+            if len(subject_spans) > 1 and enclosing >= 0:
+                animation = f"{candidates[enclosing]['args']['subject']}/{animation}"
+            animation_totals = animations.setdefault(
+                animation, {"processed_frames": 0, "frame_wall_seconds": 0.0, "frame_cpu_seconds": 0.0}
+            )
+            if name == "animation":
+                animation_totals["frames"] = event["args"].get("frames", 0)
+                animation_totals["wall_seconds"] = event["wall_seconds"]
+                animation_totals["cpu_seconds"] = event["cpu_seconds"]
+                continue
+            animation_totals["processed_frames"] += 1
+            animation_totals["frame_wall_seconds"] += event["wall_seconds"]
+            animation_totals["frame_cpu_seconds"] += event["cpu_seconds"]
+            for counter in PROFILE_COUNTERS:
+                animation_totals[counter] = animation_totals.get(counter, 0) + event["args"].get(counter, 0)
+            frames.append(dict(event["args"], wall_seconds=event["wall_seconds"], cpu_seconds=event["cpu_seconds"], pid=event["pid"]))
+
+        return {
+            "wall_seconds": time.perf_counter() - self._origin,
+            "stages": stages,
+            "animations": animations,
+            "frames": frames,
+        }
+
+    def trace(self) -> Dict[str, Any]:
+        # Chrome trace-event format, loadable in chrome://tracing or Perfetto.
+        trace_events = []
+        for event in self.events:
+            trace_events.append({
+                "name": event["name"],
+                "cat": "generator",
+                "ph": "X",
+                "ts": round((event["start"] - self._origin) * 1e6, 3),
+                "dur": round(event["wall_seconds"] * 1e6, 3),
+                "pid": event["pid"],
+                "tid": event["tid"],
+                "args": dict(event["args"], cpu_ms=round(event["cpu_seconds"] * 1000, 3)),
+            })
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def write(self, path: pathlib.Path) -> pathlib.Path:
+        # Writes the summary to path and the trace next to it; returns the
+        # trace path.
+        trace_path = path.with_name(path.stem + ".trace.json")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.summary(), indent=2, default=str), encoding="utf-8")
+        trace_path.write_text(json.dumps(self.trace(), default=str), encoding="utf-8")
+        return trace_path
+
+
+def frame_processing_settings(subject_config: SubjectConfig, is_hd: bool, reduce_file_size: bool) -> Dict[str, Any]:
+    # Every setting that changes the processed pixels of a frame.
+    return {
+        "version": FRAME_CACHE_VERSION,
+        "background_color": subject_config.background_color,
+        "color_threshold": subject_config.color_threshold,
+        "remove_background": subject_config.remove_background,
+        "resize_to_percent": subject_config.resize_to_percent,
+        "crop_sprites": subject_config.crop_sprites,
+        "is_hd": bool(is_hd),
+        "reduce_file_size": bool(reduce_file_size),
+    }
+
+
+class FrameCache:
+    # Content-addressed store of processed frames shared by every subject and
+    # theme. Entries are keyed by the raw PNG bytes plus every setting that
+    # changes the processed output. File modification times double as the LRU
+    # order, so several processes can share one cache directory.
+
+    def __init__(self, directory: pathlib.Path, size_limit_bytes: int) -> None:
+        self.directory = directory
+        self.size_limit_bytes = max(0, int(size_limit_bytes))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._entries: Dict[pathlib.Path, Tuple[float, int]] = {}
+        for path in self.directory.glob("*/*.png"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            self._entries[path] = (stat.st_mtime, stat.st_size)
+        self._total_size = sum(size for _, size in self._entries.values())
+        self._evict()
+
+    @staticmethod
+    def key_for(raw_bytes: bytes, subject_config: SubjectConfig, is_hd: bool, reduce_file_size: bool) -> str:
+        settings = frame_processing_settings(subject_config, is_hd, reduce_file_size)
+        digest = hashlib.sha256(raw_bytes)
+        digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path_for(self, key: str) -> pathlib.Path:
+        return self.directory / key[:2] / f"{key}.png"
+
+    def get(self, key: str) -> Optional[Tuple[Image.Image, Tuple[int, int], Tuple[int, int]]]:
+        path = self._path_for(key)
+        try:
+            with Image.open(path) as cached_image:
+                cached_image.load()
+                text = dict(cached_image.text)
+                image = cached_image.convert("RGBA")
+            trim_offset = tuple(int(value) for value in text["trim_offset"].split())
+            original_size = tuple(int(value) for value in text["original_size"].split())
+        except (OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+            size = path.stat().st_size
+        except OSError:
+            size = 0
+        previous = self._entries.get(path)
+        if previous is None:
+            self._total_size += size
+        self._entries[path] = (now, size if previous is None else previous[1])
+        self.hits += 1
+        return image, trim_offset, original_size
+
+    def put(self, key: str, image: Image.Image, trim_offset: Tuple[int, int], original_size: Tuple[int, int]) -> None:
+        path = self._path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        info = PngImagePlugin.PngInfo()
+        info.add_text("trim_offset", f"{trim_offset[0]} {trim_offset[1]}")
+        info.add_text("original_size", f"{original_size[0]} {original_size[1]}")
+        temp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+        image.save(temp_path, format="PNG", compress_level=1, pnginfo=info)
+        os.replace(temp_path, path)
+        size = path.stat().st_size
+        previous = self._entries.get(path)
+        if previous is not None:
+            self._total_size -= previous[1]
+        self._entries[path] = (time.time(), size)
+        self._total_size += size
+        self._evict()
+
+    def _evict(self) -> None:
+        if self._total_size <= self.size_limit_bytes:
+            return
+        for path, (_, size) in sorted(self._entries.items(), key=lambda item: item[1][0]):
+            if self._total_size <= self.size_limit_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            del self._entries[path]
+            self._total_size -= size
+            self.evictions += 1
+
+    def summary(self) -> str:
+        return (
+            f"Frame cache: {self.hits} hits, {self.misses} misses, {self.evictions} evictions, "
+            f"{self._total_size / (1024 * 1024):.1f} MB in {self.directory}."
+        )
+
+
+class DecodedFrameCache:
+    # Raw frames decoded to uncompressed RGBA .npy files, one folder per
+    # animation. Entries are named after the source's size and modification
+    # time, so an edited frame misses; hits are memory-mapped, which skips the
+    # PNG inflate on repeat runs.
+
+    def __init__(self, directory: pathlib.Path) -> None:
+        self.directory = directory
+
+    def _path_for(self, sprite_path: pathlib.Path, stat: os.stat_result) -> pathlib.Path:
+        return self.directory / sprite_path.parent.name / f"{sprite_path.name}.{stat.st_size}.{stat.st_mtime_ns}.npy"
+
+    def prune(self, sprite_paths: Sequence[pathlib.Path]) -> None:
+        # Drops the entries of one animation's folder that no current frame uses.
+        if not sprite_paths:
+            return
+        directory = self.directory / sprite_paths[0].parent.name
+        if not directory.is_dir():
+            return
+        current = {self._path_for(sprite_path, sprite_path.stat()).name for sprite_path in sprite_paths}
+        for path in directory.iterdir():
+            if path.suffix == ".npy" and path.name not in current:
+                path.unlink(missing_ok=True)
+
+    def load(self, sprite_path: pathlib.Path) -> Image.Image:
+        path = self._path_for(sprite_path, sprite_path.stat())
+        try:
+            pixels = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            pixels = None
+        if pixels is not None and pixels.dtype == np.uint8 and pixels.ndim == 3 and pixels.shape[2] == 4:
+            return Image.frombuffer("RGBA", (pixels.shape[1], pixels.shape[0]), pixels, "raw", "RGBA", 0, 1)
+
+        with Image.open(sprite_path) as source_image:
+            image = source_image.convert("RGBA")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+        with temp_path.open("wb") as handle:
+            np.save(handle, np.asarray(image))
+        os.replace(temp_path, path)
+        return image
+
+
+def read_raw_frame(sprite_path: pathlib.Path, decoded_cache: Optional[DecodedFrameCache] = None) -> Image.Image:
+    if decoded_cache is not None:
+        return decoded_cache.load(sprite_path)
+    with Image.open(sprite_path) as source_image:
+        return source_image.convert("RGBA")
+
+
+class AnimationCache:
+    # Processed sprites of every animation, kept in memory between the runs of
+    # watch mode. An entry is reused while the animation's frame files and
+    # config.json keep their sizes and modification times and the processing
+    # settings are unchanged.
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Tuple[Tuple[Any, ...], List[SpriteRecord]]] = {}
+
+    @staticmethod
+    def fingerprint(animation_dir: pathlib.Path, settings: Dict[str, Any]) -> Tuple[Any, ...]:
+        files = []
+        for path in collect_sprite_paths(animation_dir) + [animation_dir / "config.json"]:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((path.name, stat.st_size, stat.st_mtime_ns))
+        return (json.dumps(settings, sort_keys=True), tuple(files))
+
+    def get(self, animation_name: str, fingerprint: Tuple[Any, ...]) -> Optional[List[SpriteRecord]]:
+        entry = self._entries.get(animation_name)
+        if entry is None or entry[0] != fingerprint:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Copies, since stream mode moves the pixels of the records it is given.
+        return [copy.copy(sprite) for sprite in entry[1]]
+
+    def put(self, animation_name: str, fingerprint: Tuple[Any, ...], sprites: Sequence[SpriteRecord]) -> None:
+        self._entries[animation_name] = (fingerprint, [copy.copy(sprite) for sprite in sprites])
+
+    def retain(self, animation_names: Sequence[str]) -> None:
+        for name in set(self._entries) - set(animation_names):
+            del self._entries[name]
+
+
+@dataclass
+class ProgressUpdate:
+    stage: str
+    frames_done: int
+    frames_total: int
+    animation: Optional[str] = None
+
+
+class GenerationProgress:
+    # Counts processed frames and reports every step of a run to an optional
+    # callback, which is called on the generating thread. Once cancel_event is
+    # set, the next frame or stage raises GenerationCancelled.
+
+    def __init__(
+        self,
+        callback: Optional[Callable[[ProgressUpdate], None]] = None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> None:
+        self.callback = callback
+        self.cancel_event = cancel_event
+        self.stage_name = "frames"
+        self.animation: Optional[str] = None
+        self.frames_done = 0
+        self.frames_total = 0
+
+    def check_cancelled(self) -> None:
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise GenerationCancelled("Generation was cancelled.")
+
+    def _report(self) -> None:
+        self.check_cancelled()
+        if self.callback is not None:
+            self.callback(ProgressUpdate(self.stage_name, self.frames_done, self.frames_total, self.animation))
+
+    def start(self, frames_total: int) -> None:
+        self.stage_name = "frames"
+        self.frames_done = 0
+        self.frames_total = frames_total
+        self._report()
+
+    def begin_animation(self, animation_name: str) -> None:
+        self.animation = animation_name
+        self._report()
+
+    def frame_done(self) -> None:
+        self.frames_done += 1
+        self._report()
+
+    def stage(self, name: str) -> None:
+        self.stage_name = name
+        self.animation = None
+        self._report()
+
+
+def begin_staged_output(output_dir: pathlib.Path, keep_dirs: Sequence[str]) -> pathlib.Path:
+    # An empty sibling of output_dir for one run's files. The animation
+    # folders in keep_dirs are carried over as hard links where possible.
+    staging_dir = output_dir.with_name(f".{output_dir.name}.staging")
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    staging_dir.mkdir(parents=True)
+    for name in keep_dirs:
+        if (output_dir / name).is_dir():
+            shutil.copytree(output_dir / name, staging_dir / name, copy_function=_link_or_copy)
+    return staging_dir
+
+
+def _link_or_copy(source: str, destination: str) -> None:
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def commit_staged_output(staging_dir: pathlib.Path, output_dir: pathlib.Path) -> None:
+    previous_dir = output_dir.with_name(f".{output_dir.name}.previous")
+    shutil.rmtree(previous_dir, ignore_errors=True)
+    if output_dir.exists():
+        os.replace(output_dir, previous_dir)
+    os.replace(staging_dir, output_dir)
+    shutil.rmtree(previous_dir, ignore_errors=True)
+
+
+def _process_sprite_worker(
+    sprite_path: pathlib.Path,
+    output_path: pathlib.Path,
+    block_name: str,
+    reduce_file_size: bool,
+    subject_config: SubjectConfig,
+    is_hd: bool,
+    profile: bool = False,
+    frame_output: str = "png",
+    decoded_cache: Optional[DecodedFrameCache] = None
+) -> Tuple[Tuple[int, int], Tuple[int, int], Tuple[int, int], Optional[Dict[str, Any]]]:
+    started = time.perf_counter()
+    cpu_started = time.thread_time()
+    image = read_raw_frame(sprite_path, decoded_cache)
+    source_pixels = image.width * image.height
+
+    image, trim_offset, original_size = process_sprite_image(image, subject_config, is_hd, reduce_file_size)
+    written_path = write_intermediate_frame(image, output_path.parent, output_path.stem, frame_output)
+
+    stats = None
+    if profile:
+        stats = {
+            "start": started,
+            "end": time.perf_counter(),
+            "cpu_seconds": time.thread_time() - cpu_started,
+            "pid": os.getpid(),
+            "pixels": source_pixels,
+            "bytes_read": sprite_path.stat().st_size,
+            "bytes_written": written_path.stat().st_size if written_path is not None else 0,
+        }
+
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    data = image.tobytes()
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        block.buf[:len(data)] = data
+    finally:
+        block.close()
+    return image.size, trim_offset, original_size, stats
+
+
+def _shared_block_size(sprite_path: pathlib.Path, subject_config: SubjectConfig) -> int:
+    # Upper bound of the cropped RGBA buffer, read from the PNG header only.
+    with Image.open(sprite_path) as source_image:
+        width, height = source_image.size
+    percent = subject_config.resize_to_percent
+    if not (percent == 100 or percent == None):
+        scale = percent / 100.0
+        width = max(1, int(round(width * scale)))
+        height = max(1, int(round(height * scale)))
+    return (width + 1) * (height + 1) * 4
+
+
+def _process_sprites_parallel(
+    sprite_paths: Sequence[pathlib.Path],
+    output_dir: pathlib.Path,
+    reduce_file_size: bool,
+    subject_config: SubjectConfig,
+    is_hd: bool,
+    executor: Executor,
+    profiler: Any = NULL_PROFILER,
+    frame_output: str = "png",
+    progress: Optional[GenerationProgress] = None,
+    decoded_cache: Optional[DecodedFrameCache] = None,
+    workers: int = 1
+) -> List[Tuple[Image.Image, Tuple[int, int], Tuple[int, int]]]:
+    # The parent owns every shared memory block: it creates one per in-flight
+    # frame, the worker writes the cropped pixels into it, and the parent copies
+    # them out and unlinks it. The window keeps the number of live blocks
+    # bounded; workers is the executor's worker count, which the caller knows.
+    window = max(2, workers * 2)
+    pending: Deque[Tuple[Future, shared_memory.SharedMemory, pathlib.Path]] = deque()
+    results: List[Tuple[Image.Image, Tuple[int, int], Tuple[int, int]]] = []
+
+    def collect() -> None:
+        future, block, sprite_path = pending.popleft()
+        try:
+            size, trim_offset, original_size, stats = future.result()
+            view = block.buf[:size[0] * size[1] * 4]
+            try:
+                image = Image.frombytes("RGBA", size, view)
+            finally:
+                view.release()
+        finally:
+            block.close()
+            block.unlink()
+        if stats is not None:
+            profiler.record(
+                "frame",
+                stats["start"],
+                stats["end"],
+                stats["cpu_seconds"],
+                {
+                    "animation": output_dir.name,
+                    "frame": sprite_path.name,
+                    "pixels": stats["pixels"],
+                    "bytes_read": stats["bytes_read"],
+                    "bytes_written": stats["bytes_written"],
+                },
+                pid=stats["pid"],
+            )
+        results.append((image, trim_offset, original_size))
+        if progress is not None:
+            progress.frame_done()
+
+    try:
+        for sprite_path in sprite_paths:
+            block = shared_memory.SharedMemory(create=True, size=_shared_block_size(sprite_path, subject_config))
+            try:
+                future = executor.submit(
+                    _process_sprite_worker,
+                    sprite_path,
+                    output_dir / f"{sprite_path.stem}.png",
+                    block.name,
+                    reduce_file_size,
+                    subject_config,
+                    is_hd,
+                    profiler.enabled,
+                    frame_output,
+                    decoded_cache
+                )
+            except BaseException:
+                block.close()
+                block.unlink()
+                raise
+            pending.append((future, block, sprite_path))
+            if len(pending) >= window:
+                collect()
+        while pending:
+            collect()
+    finally:
+        for future, block, _ in pending:
+            future.cancel()
+        for future, block, _ in pending:
+            if not future.cancelled():
+                try:
+                    future.result()
+                except Exception:
+                    pass
+            block.close()
+            block.unlink()
+    return results
+
+
+def process_sprites(
+    sprite_paths: Sequence[pathlib.Path],
+    output_dir: pathlib.Path,
+    reduce_file_size: bool,
+    subject_config: SubjectConfig,
+    animation_config: AnimationConfig,
+    is_hd: bool,
+    executor: Optional[Executor] = None,
+    frame_cache: Optional[FrameCache] = None,
+    profiler: Any = NULL_PROFILER,
+    frame_writer: Optional[FrameWriter] = None,
+    progress: Optional[GenerationProgress] = None,
+    decoded_cache: Optional[DecodedFrameCache] = None,
+    workers: int = 1
+) -> List[SpriteRecord]:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    animation_name = output_dir.name
+    if frame_writer is None:
+        frame_writer = FrameWriter("png")
+    if progress is None:
+        progress = GenerationProgress()
+
+    results: List[Optional[Tuple[Image.Image, Tuple[int, int], Tuple[int, int]]]] = [None] * len(sprite_paths)
+    cache_keys: List[Optional[str]] = [None] * len(sprite_paths)
+    if frame_cache is not None:
+        for index, sprite_path in enumerate(sprite_paths):
+            with profiler.stage("frame_cache_lookup", animation=animation_name, frame=sprite_path.name) as span:
+                raw_bytes = sprite_path.read_bytes()
+                span.add("bytes_read", len(raw_bytes))
+                cache_keys[index] = frame_cache.key_for(raw_bytes, subject_config, is_hd, reduce_file_size)
+                cached = frame_cache.get(cache_keys[index])
+                if cached is None:
+                    continue
+                results[index] = cached
+                written_path = frame_writer.write(cached[0], output_dir, sprite_path.stem)
+                if profiler.enabled and written_path is not None:
+                    span.add("bytes_written", written_path.stat().st_size)
+            progress.frame_done()
+
+    missing = [index for index, result in enumerate(results) if result is None]
+    if decoded_cache is not None:
+        decoded_cache.prune(sprite_paths)
+
+    if executor is not None:
+        computed = _process_sprites_parallel(
+            [sprite_paths[index] for index in missing],
+            output_dir,
+            reduce_file_size,
+            subject_config,
+            is_hd,
+            executor,
+            profiler,
+            frame_writer.worker_mode,
+            progress,
+            decoded_cache,
+            workers
+        )
+        for index, result in zip(missing, computed):
+            results[index] = result
+    else:
+        for index in missing:
+            sprite_path = sprite_paths[index]
+            with profiler.stage("frame", animation=animation_name, frame=sprite_path.name) as span:
+                image = read_raw_frame(sprite_path, decoded_cache)
+                span.add("pixels", image.width * image.height)
+
+                image, trim_offset, original_size = process_sprite_image(image, subject_config, is_hd, reduce_file_size)
 
-        processed.append({
-            "image": image,
-            "trim_offset": trim_offset,
-            "original_size": original_size,
-            "offset": animation_config.offset,
-            "recover_cropped_offset": animation_config.recover_cropped_offset,
-        })
 
-    return processed
+                written_path = frame_writer.write(image, output_dir, sprite_path.stem)
+                if profiler.enabled:
+                    span.add("bytes_read", sprite_path.stat().st_size)
+                    if written_path is not None:
+                        span.add("bytes_written", written_path.stat().st_size)
+
+            results[index] = (image, trim_offset, original_size)
+            progress.frame_done()
+
+    if frame_cache is not None:
+        with profiler.stage("frame_cache_store", animation=animation_name, frames=len(missing)):
+            for index in missing:
+                frame_cache.put(cache_keys[index], *results[index])
+
+    return build_sprite_records(results, animation_config.offset, animation_config.recover_cropped_offset)
 
 
 def layout_for_width(
-    sprites: Sequence[Dict[str, Any]],
+    sprites: Sequence[SpriteRecord],
     width_limit: int,
     is_hd : bool
 ) -> Dict[str, Any]:
@@ -498,12 +1636,12 @@ def layout_for_width(
         gap = LAYOUT_GAP
         
     if width_limit <= 0:
-        raise SystemExit("width_limit must be greater than zero.")
+        raise LayoutError("width_limit must be greater than zero.")
     if not sprites:
         return {"width": 0, "height": 0, "positions": []}
-    max_sprite_width = max(sprite["image"].width for sprite in sprites)
+    max_sprite_width = max(sprite.width for sprite in sprites)
     if width_limit < max_sprite_width:
-        raise SystemExit("width_limit is smaller than the widest sprite.")
+        raise LayoutError("width_limit is smaller than the widest sprite.")
 
     rows: List[Dict[str, Any]] = []
     current_indices: List[int] = []
@@ -511,7 +1649,7 @@ def layout_for_width(
     current_height = 0
 
     for index, sprite in enumerate(sprites):
-        sprite_width, sprite_height = sprite["image"].size
+        sprite_width, sprite_height = sprite.size
         projected_width = sprite_width if not current_indices else current_width + gap + sprite_width
         if current_indices and projected_width > width_limit:
             rows.append({
@@ -555,10 +1693,10 @@ def layout_for_width(
                 y_offset = ensure_even_value(y_offset)
         x_offset = 0
         for item_index, sprite_index in enumerate(row["indices"]):
-            sprite_image = sprites[sprite_index]["image"]
-            y_position = y_offset + (row["height"] - sprite_image.height)
+            sprite = sprites[sprite_index]
+            y_position = y_offset + (row["height"] - sprite.height)
             positions[sprite_index] = (x_offset, y_position)
-            x_offset += sprite_image.width
+            x_offset += sprite.width
             if item_index < len(row["indices"]) - 1:
                 x_offset = x_offset + gap
                 if is_hd:
@@ -568,54 +1706,339 @@ def layout_for_width(
     return {"width": sheet_width, "height": sheet_height, "positions": positions}
 
 
+def _packing_gap(is_hd: bool) -> int:
+    return LAYOUT_GAP if is_hd else 1
+
+
+def _packing_sizes(sprites: Sequence[SpriteRecord], width_limit: int, is_hd: bool) -> List[Tuple[int, int]]:
+    if width_limit <= 0:
+        raise LayoutError("width_limit must be greater than zero.")
+    sizes = [sprite.size for sprite in sprites]
+    if sizes and width_limit < max(width for width, _ in sizes):
+        raise LayoutError("width_limit is smaller than the widest sprite.")
+    return sizes
+
+
+def _inflated_size(size: Tuple[int, int], gap: int, is_hd: bool) -> Tuple[int, int]:
+    # Every rect reserves the gap on its right and bottom edge. HD sheets keep
+    # the reserved size even so every placement lands on an even coordinate.
+    width, height = size[0] + gap, size[1] + gap
+    if is_hd:
+        width, height = ensure_even_value(width), ensure_even_value(height)
+    return width, height
+
+
+def _packing_order(sizes: Sequence[Tuple[int, int]]) -> List[int]:
+    return sorted(range(len(sizes)), key=lambda index: (-sizes[index][1], -sizes[index][0], index))
+
+
+def _packed_layout(sizes: Sequence[Tuple[int, int]], positions: List[Optional[Tuple[int, int]]]) -> Dict[str, Any]:
+    width = max(position[0] + size[0] for size, position in zip(sizes, positions))
+    height = max(position[1] + size[1] for size, position in zip(sizes, positions))
+    return {"width": width, "height": height, "positions": positions}
+
+
+def layout_sorted_shelf(
+    sprites: Sequence[SpriteRecord],
+    width_limit: int,
+    is_hd: bool
+) -> Dict[str, Any]:
+    # The shelf packer fed the frames tallest first, so each row holds frames
+    # of similar height.
+    if not sprites:
+        return {"width": 0, "height": 0, "positions": []}
+    order = _packing_order(_packing_sizes(sprites, width_limit, is_hd))
+    layout = layout_for_width([sprites[index] for index in order], width_limit, is_hd)
+    positions: List[Optional[Tuple[int, int]]] = [None] * len(sprites)
+    for position, index in zip(layout["positions"], order):
+        positions[index] = position
+    return {"width": layout["width"], "height": layout["height"], "positions": positions}
+
+
+def layout_skyline(
+    sprites: Sequence[SpriteRecord],
+    width_limit: int,
+    is_hd: bool
+) -> Dict[str, Any]:
+    # Skyline bottom-left packer: each frame goes where its top edge ends up
+    # lowest, with the leftmost position winning ties.
+    if not sprites:
+        return {"width": 0, "height": 0, "positions": []}
+    gap = _packing_gap(is_hd)
+    sizes = _packing_sizes(sprites, width_limit, is_hd)
+    bin_width = width_limit + gap
+    skyline: List[List[int]] = [[0, 0, bin_width]]
+    positions: List[Optional[Tuple[int, int]]] = [None] * len(sprites)
+
+    for index in _packing_order(sizes):
+        rect_width, rect_height = _inflated_size(sizes[index], gap, is_hd)
+        rect_width = min(rect_width, bin_width)
+        best: Optional[Tuple[int, int, int]] = None
+        for start, (x, _, _) in enumerate(skyline):
+            if x + rect_width > bin_width:
+                break
+            y = 0
+            covered = 0
+            segment = start
+            while covered < rect_width:
+                y = max(y, skyline[segment][1])
+                covered = skyline[segment][0] + skyline[segment][2] - x
+                segment += 1
+            if best is None or (y + rect_height, x) < (best[0] + rect_height, best[1]):
+                best = (y, x, start)
+        y, x, start = best
+        positions[index] = (x, y)
+
+        right = x + rect_width
+        updated = skyline[:start]
+        updated.append([x, y + rect_height, rect_width])
+        for segment_x, segment_y, segment_width in skyline[start:]:
+            segment_right = segment_x + segment_width
+            if segment_right <= right:
+                continue
+            if segment_x < right:
+                updated.append([right, segment_y, segment_right - right])
+            else:
+                updated.append([segment_x, segment_y, segment_width])
+        skyline = []
+        for segment in updated:
+            if skyline and skyline[-1][1] == segment[1]:
+                skyline[-1][2] += segment[2]
+            else:
+                skyline.append(segment)
+
+    return _packed_layout(sizes, positions)
+
+
+def layout_maxrects(
+    sprites: Sequence[SpriteRecord],
+    width_limit: int,
+    is_hd: bool
+) -> Dict[str, Any]:
+    # MaxRects packer with the bottom-left rule over a strip of unbounded
+    # height. Free space is kept as maximal, possibly overlapping rectangles.
+    if not sprites:
+        return {"width": 0, "height": 0, "positions": []}
+    gap = _packing_gap(is_hd)
+    sizes = _packing_sizes(sprites, width_limit, is_hd)
+    bin_width = width_limit + gap
+    inflated = [_inflated_size(size, gap, is_hd) for size in sizes]
+    bin_height = sum(height for _, height in inflated)
+    # Free rects as (left, top, right, bottom) rows. No free rect contains
+    # another, so their order never changes a placement and the searches
+    # below run over whole columns at once.
+    free = np.array([[0, 0, bin_width, bin_height]], dtype=np.int64)
+    unplaced = np.iinfo(np.int64).max
+    positions: List[Optional[Tuple[int, int]]] = [None] * len(sprites)
+
+    for index in _packing_order(sizes):
+        rect_width, rect_height = inflated[index]
+        rect_width = min(rect_width, bin_width)
+        lefts, tops, rights, bottoms = free[:, 0], free[:, 1], free[:, 2], free[:, 3]
+        # Bottom-left: the lowest top edge, then the leftmost.
+        fit_keys = np.where(
+            (rights - lefts >= rect_width) & (bottoms - tops >= rect_height), tops * (bin_width + 1) + lefts, unplaced
+        )
+        x, y = free[int(fit_keys.argmin()), :2].tolist()
+        positions[index] = (x, y)
+        right, bottom = x + rect_width, y + rect_height
+
+        touched = np.flatnonzero((lefts < right) & (rights > x) & (tops < bottom) & (bottoms > y))
+        split: List[Tuple[int, int, int, int]] = []
+        for free_left, free_top, free_right, free_bottom in free[touched].tolist():
+            if x > free_left:
+                split.append((free_left, free_top, x, free_bottom))
+            if right < free_right:
+                split.append((right, free_top, free_right, free_bottom))
+            if y > free_top:
+                split.append((free_left, free_top, free_right, y))
+            if bottom < free_bottom:
+                split.append((free_left, bottom, free_right, free_bottom))
+        kept = np.delete(free, touched, axis=0)
+        if not split:
+            free = kept
+            continue
+
+        # Only the new rects can be redundant: each lies inside a touched free
+        # rect, so it cannot contain a kept one. Of two equal new rects the
+        # first one stays.
+        candidates = np.array(split, dtype=np.int64)
+        outer = np.concatenate((kept, candidates))
+        inside = (
+            (outer[:, None, 0] <= candidates[:, 0]) & (outer[:, None, 1] <= candidates[:, 1])
+            & (outer[:, None, 2] >= candidates[:, 2]) & (outer[:, None, 3] >= candidates[:, 3])
+        )
+        same = (candidates[:, None, :] == candidates[None, :, :]).all(axis=2)
+        inside[len(kept):] &= ~same | ~np.tri(len(candidates), dtype=bool)
+        free = np.concatenate((kept, candidates[~inside.any(axis=0)]))
+
+    return _packed_layout(sizes, positions)
+
+
+PACKING_ENGINES = {
+    "shelf": layout_for_width,
+    "sorted_shelf": layout_sorted_shelf,
+    "skyline": layout_skyline,
+    "maxrects": layout_maxrects,
+}
+PACKER_CHOICES = tuple(PACKING_ENGINES) + ("best",)
+PACKER_SEARCH_STEPS = 24
+# Packers too slow to try every sampled width: they try every
+# PACKER_COARSE_STRIDE-th one, then narrow in on the best.
+COARSE_SEARCH_PACKERS = ("maxrects",)
+PACKER_COARSE_STRIDE = 4
+
+
+def layout_occupancy(sprites: Sequence[SpriteRecord], width: int, height: int) -> float:
+    if width <= 0 or height <= 0:
+        return 0.0
+    used = sum(sprite.width * sprite.height for sprite in sprites)
+    return used / float(width * height)
+
+
+class ShelfLayoutMeasure:
+    # Computes the sheet size layout_for_width would produce for any width
+    # without placing every sprite. Row breaks are found by bisecting the gap
+    # adjusted prefix sums and row heights come from a sparse max table, so a
+    # width costs O(rows * log n) instead of O(n). Summed over the candidate
+    # widths auto_layout tries, that is O(n log^2 n) instead of O(n^2).
+
+    def __init__(self, sizes: Sequence[Tuple[int, int]], is_hd: bool) -> None:
+        self.is_hd = is_hd
+        self.gap = LAYOUT_GAP if is_hd else 1
+        self.count = len(sizes)
+        self.prefix = [0] * (self.count + 1)
+        for index, (width, _) in enumerate(sizes):
+            self.prefix[index + 1] = self.prefix[index] + width + self.gap
+        self.max_tables: List[List[int]] = [[height for _, height in sizes]]
+        span = 1
+        while span * 2 <= self.count:
+            previous = self.max_tables[-1]
+            self.max_tables.append([
+                max(previous[index], previous[index + span])
+                for index in range(self.count - span * 2 + 1)
+            ])
+            span *= 2
+
+    def _range_max(self, start: int, end: int) -> int:
+        level = (end - start).bit_length() - 1
+        table = self.max_tables[level]
+        return max(table[start], table[end - (1 << level)])
+
+    def measure(self, width_limit: int) -> Tuple[int, int]:
+        gap = self.gap
+        prefix = self.prefix
+        sheet_width = 0
+        sheet_height = 0
+        start = 0
+        while start < self.count:
+            end = bisect.bisect_right(prefix, prefix[start] + width_limit + gap, start + 1) - 1
+            end = max(end, start + 1)
+            row_width = prefix[end] - prefix[start] - gap
+            if start > 0:
+                sheet_height = sheet_height + gap
+                if self.is_hd:
+                    sheet_height = ensure_even_value(sheet_height)
+            sheet_height += self._range_max(start, end)
+            sheet_width = max(sheet_width, row_width)
+            start = end
+        return sheet_width, sheet_height
+
+
 def auto_layout(
-    sprites: Sequence[Dict[str, Any]],
+    sprites: Sequence[SpriteRecord],
     is_hd: bool,
     max_height: Optional[int] = None,
+    packer: str = "shelf",
 ) -> Dict[str, Any]:
     gap = 1
     if is_hd:
         gap = LAYOUT_GAP
     if not sprites:
         return {"width": 0, "height": 0, "positions": []}
-    widths = [sprite["image"].width for sprite in sprites]
+    pack = PACKING_ENGINES[packer]
+    widths = [sprite.width for sprite in sprites]
     max_width = max(widths)
     total_width = sum(widths)
     candidate_widths = {max_width, total_width + gap * (len(sprites) - 1)}
-    prefix = 0
-    for index, width in enumerate(widths):
-        prefix += width
-        candidate_widths.add(max(max_width, prefix + gap * index))
-
-    best_layout: Optional[Dict[str, Any]] = None
-    best_score: Optional[Tuple[float, float, float]] = None
-
-    for width_limit in sorted(candidate_widths):
+    shelf_measure: Optional[ShelfLayoutMeasure] = None
+    if packer == "shelf":
+        prefix = 0
+        for index, width in enumerate(widths):
+            prefix += width
+            candidate_widths.add(max(max_width, prefix + gap * index))
+        shelf_measure = ShelfLayoutMeasure([sprite.size for sprite in sprites], is_hd)
+    else:
+        # Free-form packers are too slow to try every prefix width, so sample
+        # widths geometrically between the widest frame and a single row.
+        widest_row = total_width + gap * (len(sprites) - 1)
+        ratio = widest_row / float(max_width)
+        for step in range(1, PACKER_SEARCH_STEPS):
+            candidate_widths.add(int(round(max_width * ratio ** (step / float(PACKER_SEARCH_STEPS)))))
+
+    scores: Dict[int, Optional[Tuple[float, float, float]]] = {}
+    best: Dict[str, Any] = {"key": None, "layout": None}
+
+    def score_width(width_limit: int) -> None:
+        if width_limit in scores:
+            return
+        scores[width_limit] = None
+        layout: Optional[Dict[str, Any]] = None
         try:
-            layout = layout_for_width(sprites, int(round(width_limit)), is_hd)
+            if shelf_measure is not None:
+                layout_width, layout_height = shelf_measure.measure(width_limit)
+            else:
+                layout = pack(sprites, width_limit, is_hd)
+                layout_width, layout_height = layout["width"], layout["height"]
         except ValueError:
-            continue
-        if max_height is not None and layout["height"] > max_height:
-            continue
-        diff = abs(layout["width"] - layout["height"])
-        area = float(layout["width"] * max(layout["height"], 1))
-        height_gap = abs(max_height - layout["height"]) if max_height is not None else 0.0
-        score = (height_gap, diff, area)
-        if best_score is None or score < best_score:
-            best_layout = layout
-            best_score = score
+            return
+        if max_height is not None and layout_height > max_height:
+            return
+        diff = abs(layout_width - layout_height)
+        area = float(layout_width * max(layout_height, 1))
+        height_gap = abs(max_height - layout_height) if max_height is not None else 0.0
+        scores[width_limit] = (height_gap, diff, area)
+        # Ties go to the narrower width.
+        key = (scores[width_limit], width_limit)
+        if best["key"] is None or key < best["key"]:
+            best["key"] = key
+            best["layout"] = layout
+
+    ordered_widths = sorted({int(round(width_limit)) for width_limit in candidate_widths})
+    if packer in COARSE_SEARCH_PACKERS:
+        stride = PACKER_COARSE_STRIDE
+        searched = list(range(0, len(ordered_widths), stride)) + [len(ordered_widths) - 1]
+        while True:
+            for position in searched:
+                score_width(ordered_widths[position])
+            if stride == 1 or best["key"] is None:
+                break
+            stride //= 2
+            best_position = ordered_widths.index(best["key"][1])
+            searched = [
+                position for position in (best_position - stride, best_position + stride)
+                if 0 <= position < len(ordered_widths)
+            ]
+    else:
+        for width_limit in ordered_widths:
+            score_width(width_limit)
 
-    if best_layout is None:
-        raise SystemExit("Unable to find an automatic layout that satisfies the constraints.")
-    return best_layout
+    if best["key"] is None:
+        raise LayoutError("Unable to find an automatic layout that satisfies the constraints.")
+    if best["layout"] is None:
+        return pack(sprites, best["key"][1], is_hd)
+    return best["layout"]
 
 
 def select_layout(
-    sprites: Sequence[Dict[str, Any]],
+    sprites: Sequence[SpriteRecord],
     forced_width: Optional[int],
     forced_height: Optional[int],
-    is_hd: bool
+    is_hd: bool,
+    packer: str = "shelf"
 ) -> Dict[str, Any]:
+    if packer not in PACKER_CHOICES:
+        raise ConfigError(f"Unsupported packer: {packer}")
     if not sprites:
         canvas_width = forced_width or 0
         canvas_height = forced_height or 0
@@ -625,11 +2048,31 @@ def select_layout(
             "canvas_width": canvas_width,
             "canvas_height": canvas_height,
             "positions": [],
+            "packer": packer,
+            "occupancy": 0.0,
         }
+    if packer == "best":
+        # Keep the engine that yields the smallest canvas, then the fullest one.
+        best_info: Optional[Dict[str, Any]] = None
+        failure: Optional[LayoutError] = None
+        for engine in PACKING_ENGINES:
+            try:
+                info = select_layout(sprites, forced_width, forced_height, is_hd, engine)
+            except LayoutError as exc:
+                failure = exc
+                continue
+            area = info["canvas_width"] * info["canvas_height"]
+            if best_info is None or (area, -info["occupancy"]) < (
+                best_info["canvas_width"] * best_info["canvas_height"], -best_info["occupancy"]
+            ):
+                best_info = info
+        if best_info is None:
+            raise failure
+        return best_info
     if forced_width is not None:
-        layout = layout_for_width(sprites, forced_width, is_hd)
+        layout = PACKING_ENGINES[packer](sprites, forced_width, is_hd)
         if forced_height is not None and layout["height"] > forced_height:
-            raise SystemExit("Sprites do not fit within the requested sheet height.")
+            raise LayoutError("Sprites do not fit within the requested sheet height.")
         canvas_width = forced_width
         canvas_height = forced_height if forced_height is not None else layout["height"]
         return {
@@ -638,8 +2081,10 @@ def select_layout(
             "canvas_width": canvas_width,
             "canvas_height": canvas_height,
             "positions": list(layout["positions"]),
+            "packer": packer,
+            "occupancy": layout_occupancy(sprites, canvas_width, canvas_height),
         }
-    layout = auto_layout(sprites, is_hd, max_height=forced_height)
+    layout = auto_layout(sprites, is_hd, max_height=forced_height, packer=packer)
     canvas_height = forced_height if forced_height is not None else layout["height"]
     return {
         "layout_width": layout["width"],
@@ -647,31 +2092,292 @@ def select_layout(
         "canvas_width": layout["width"],
         "canvas_height": canvas_height,
         "positions": list(layout["positions"]),
+        "packer": packer,
+        "occupancy": layout_occupancy(sprites, layout["width"], canvas_height),
     }
 
 def create_sprite_sheet(
-    sprites: Sequence[Dict[str, Any]],
+    sprites: Sequence[SpriteRecord],
     positions: Sequence[Tuple[int, int]],
     canvas_size: Tuple[int, int],
 ) -> Image.Image:
     width, height = canvas_size
     if width <= 1 or height <= 1:
-        raise SystemExit("Sprites don't exist.")
+        raise InputError("Sprites don't exist.")
     sheet = Image.new("RGBA", (width, height))
     for sprite, position in zip(sprites, positions):
         if position is None:
             continue
-        sheet.paste(sprite["image"], position, sprite["image"])
+        image = sprite.image()
+        sheet.paste(image, position, None if sprite.arena.composited else image)
     return sheet
 
 
+def run_concurrently(jobs: Sequence[Callable[[], Any]]) -> List[Any]:
+    # zlib releases the GIL while it compresses, so output files encode side
+    # by side on threads. Every job finishes before the first failure is raised.
+    if len(jobs) <= 1:
+        return [job() for job in jobs]
+    with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="output-writer") as pool:
+        futures = [pool.submit(job) for job in jobs]
+    return [future.result() for future in futures]
+
+
+class FrameSpillStore:
+    # Append-only temporary file holding the raw RGBA pixels of cropped frames.
+    # It stands in for a PixelArena once records are spilled.
+    composited = False
+
+    def __init__(self) -> None:
+        self._handle = tempfile.TemporaryFile()
+        self._end = 0
+
+    def append(self, pixels: np.ndarray) -> int:
+        offset = self._end
+        self._handle.seek(offset)
+        self._handle.write(pixels)
+        self._end += pixels.nbytes
+        return offset
+
+    def pixels(self, offset: int, size: Tuple[int, int]) -> np.ndarray:
+        self._handle.seek(offset)
+        return np.frombuffer(self._handle.read(size[0] * size[1] * 4), dtype=np.uint8)
+
+    def image(self, offset: int, size: Tuple[int, int]) -> Image.Image:
+        self._handle.seek(offset)
+        return Image.frombytes("RGBA", size, self._handle.read(size[0] * size[1] * 4))
+
+    def close(self) -> None:
+        self._handle.close()
+
+
+def spill_sprites(sprites: Sequence[SpriteRecord], store: FrameSpillStore) -> None:
+    # Records backed by frame files already keep nothing in memory.
+    for sprite in sprites:
+        if isinstance(sprite.arena, PixelArena):
+            sprite.arena_offset = store.append(sprite.pixels())
+            sprite.arena = store
+
+
+class StreamingPngWriter:
+    # Minimal 8-bit RGBA PNG encoder fed a band of rows at a time. Rows use the
+    # Up filter, which vectorizes well and suits mostly transparent sheets.
+
+    def __init__(self, path: pathlib.Path, width: int, height: int, compress_level: int) -> None:
+        self.width = width
+        self.height = height
+        self._rows_written = 0
+        self._handle = path.open("wb")
+        self._compressor = zlib.compressobj(compress_level)
+        self._previous_row = np.zeros(width * 4, dtype=np.uint8)
+        self._pending = bytearray()
+        self._handle.write(PNG_SIGNATURE)
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+
+    def _write_chunk(self, kind: bytes, data: bytes) -> None:
+        self._handle.write(struct.pack(">I", len(data)))
+        self._handle.write(kind)
+        self._handle.write(data)
+        self._handle.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+    def _flush_pending(self, force: bool) -> None:
+        while len(self._pending) >= PNG_IDAT_CHUNK_SIZE or (force and self._pending):
+            self._write_chunk(b"IDAT", bytes(self._pending[:PNG_IDAT_CHUNK_SIZE]))
+            del self._pending[:PNG_IDAT_CHUNK_SIZE]
+
+    def write_rows(self, rows: np.ndarray) -> None:
+        count = rows.shape[0]
+        if count == 0:
+            return
+        flat = rows.reshape(count, self.width * 4)
+        filtered = np.empty((count, self.width * 4 + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        np.subtract(flat[0], self._previous_row, out=filtered[0, 1:])
+        np.subtract(flat[1:], flat[:-1], out=filtered[1:, 1:])
+        self._previous_row = flat[-1].copy()
+        self._rows_written += count
+        self._pending += self._compressor.compress(filtered.tobytes())
+        self._flush_pending(False)
+
+    def close(self) -> None:
+        try:
+            if self._rows_written != self.height:
+                raise OutputError(f"Streamed {self._rows_written} rows into a sheet of height {self.height}.")
+            self._pending += self._compressor.flush()
+            self._flush_pending(True)
+            self._write_chunk(b"IEND", b"")
+        finally:
+            self._handle.close()
+
+
+def write_sprite_sheets_streaming(
+    sprites: Sequence[SpriteRecord],
+    positions: Sequence[Tuple[int, int]],
+    canvas_size: Tuple[int, int],
+    sheet_path: pathlib.Path,
+    half_sheet_path: Optional[pathlib.Path],
+    reduce_file_size: bool,
+    band_height: int = DEFAULT_BAND_HEIGHT
+) -> Optional[Tuple[int, int]]:
+    # Composes the sheet one horizontal band at a time and encodes each band
+    # before the next one is built, so only the frames crossing the band are
+    # decoded. The half-res sheet samples the same bands with the row and
+    # column indices Pillow's NEAREST resize would use.
+    width, height = canvas_size
+    if width <= 1 or height <= 1:
+        raise InputError("Sprites don't exist.")
+    band_height = max(2, band_height - band_height % 2)
+    compress_level = 9 if reduce_file_size else 6
+
+    placements = sorted(
+        (position[1], index) for index, position in enumerate(positions) if position is not None
+    )
+    next_placement = 0
+    active: Dict[int, Image.Image] = {}
+
+    half_size: Optional[Tuple[int, int]] = None
+    half_writer: Optional[StreamingPngWriter] = None
+    writer = StreamingPngWriter(sheet_path, width, height, compress_level)
+    try:
+        if half_sheet_path is not None:
+            half_size = (max(1, (width + 1) // 2), max(1, (height + 1) // 2))
+            half_writer = StreamingPngWriter(half_sheet_path, half_size[0], half_size[1], 6)
+            half_columns = _nearest_source_indices(width, half_size[0])
+            half_rows = _nearest_source_indices(height, half_size[1])
+            next_half_row = 0
+
+        for band_top in range(0, height, band_height):
+            band_bottom = min(height, band_top + band_height)
+            while next_placement < len(placements) and placements[next_placement][0] < band_bottom:
+                index = placements[next_placement][1]
+                active[index] = sprites[index].image()
+                next_placement += 1
+
+            band = Image.new("RGBA", (width, band_bottom - band_top))
+            for index in list(active):
+                image = active[index]
+                left, top = positions[index]
+                if top + image.height <= band_top:
+                    del active[index]
+                    continue
+                crop_top = max(0, band_top - top)
+                crop_bottom = min(image.height, band_bottom - top)
+                if crop_bottom <= crop_top:
+                    continue
+                region = image if crop_top == 0 and crop_bottom == image.height else image.crop((0, crop_top, image.width, crop_bottom))
+                band.paste(region, (left, top + crop_top - band_top), None if sprites[index].arena.composited else region)
+
+            band_pixels = np.asarray(band)
+            writer.write_rows(band_pixels)
+
+            if half_writer is not None:
+                end_half_row = next_half_row
+                while end_half_row < len(half_rows) and half_rows[end_half_row] < band_bottom:
+                    end_half_row += 1
+                if end_half_row > next_half_row:
+                    sampled = band_pixels[half_rows[next_half_row:end_half_row] - band_top][:, half_columns]
+                    half_writer.write_rows(sampled)
+                    next_half_row = end_half_row
+
+        writer.close()
+        if half_writer is not None:
+            half_writer.close()
+    except BaseException:
+        for open_writer in (writer, half_writer):
+            if open_writer is not None and not open_writer._handle.closed:
+                open_writer._handle.close()
+        raise
+    return half_size
+
+
+def estimate_frame_bytes(sprite_paths: Sequence[pathlib.Path], resize_to_percent: Optional[float]) -> int:
+    # Upper bound of the RGBA bytes the given frames take once decoded, read
+    # from the PNG headers only.
+    scale = 1.0
+    if not (resize_to_percent == 100 or resize_to_percent == None):
+        scale = resize_to_percent / 100.0
+    total = 0
+    for sprite_path in sprite_paths:
+        try:
+            width, height = read_frame_size(sprite_path)
+        except (OSError, ValueError, InputError):
+            continue
+        total += max(1, int(round(width * scale))) * max(1, int(round(height * scale))) * 4
+    return total
+
+
+def _visible_pixels(pixels: np.ndarray) -> np.ndarray:
+    # Color under fully transparent pixels never reaches the sheet, and
+    # keying leaves background noise there unless reduce_file_size clears
+    # it, so it is zeroed before frames are compared.
+    rgba = pixels.reshape(-1, 4)
+    hidden = rgba[:, 3] == 0
+    if not hidden.any():
+        return pixels
+    visible = rgba.copy()
+    visible[hidden] = 0
+    return visible.reshape(-1)
+
+
+def deduplicate_sprites(
+    sprites: Sequence[SpriteRecord],
+    tolerance: float = 0
+) -> Tuple[List[SpriteRecord], List[int]]:
+    # Returns the sprites to pack plus, for every sprite, the index of the
+    # packed sprite holding its pixels. Frames match when their sizes are equal
+    # and no channel of any visible pixel differs by more than the tolerance.
+    # Frames within the tolerance have channel means within it too, so
+    # candidates are bucketed by their overall mean and only frames in the
+    # same or a neighbouring bucket with close channel means are compared.
+    unique: List[SpriteRecord] = []
+    unique_index_by_use: List[int] = []
+    exact_index: Dict[Tuple[Tuple[int, int], bytes], int] = {}
+    candidates_by_bucket: Dict[Tuple[Tuple[int, int], int], List[Tuple[int, np.ndarray]]] = {}
+
+    for sprite in sprites:
+        pixels = _visible_pixels(sprite.pixels())
+        exact_key = (sprite.size, hashlib.sha1(pixels).digest())
+        match = exact_index.get(exact_key)
+        bucket = 0
+        channel_means = None
+        if tolerance > 0:
+            rgba = pixels.reshape(-1, 4)
+            channel_means = rgba.mean(axis=0) if len(rgba) else np.zeros(4)
+            bucket = int(channel_means.mean() // tolerance)
+        if match is None and tolerance > 0:
+            # The earliest matching frame wins, whichever bucket it is in.
+            candidates = sorted(
+                candidate
+                for neighbour in (bucket - 1, bucket, bucket + 1)
+                for candidate in candidates_by_bucket.get((sprite.size, neighbour), ())
+            )
+            for candidate_index, candidate_means in candidates:
+                if float(np.abs(channel_means - candidate_means).max()) > tolerance:
+                    continue
+                candidate_pixels = _visible_pixels(unique[candidate_index].pixels())
+                difference = np.maximum(pixels, candidate_pixels) - np.minimum(pixels, candidate_pixels)
+                if int(difference.max()) <= tolerance:
+                    match = candidate_index
+                    break
+        if match is None:
+            match = len(unique)
+            unique.append(sprite)
+            exact_index[exact_key] = match
+            if tolerance > 0:
+                candidates_by_bucket.setdefault((sprite.size, bucket), []).append((match, channel_means))
+        unique_index_by_use.append(match)
+
+    return unique, unique_index_by_use
+
+
 def export_sprite_metadata(
-    sprites: Sequence[Dict[str, Any]],
+    sprites: Sequence[SpriteRecord],
     positions: Sequence[Tuple[int, int]],
     source_canvas: Tuple[int, int],
     animations: Sequence[Dict[str, Any]],
     sub_positions: str,
-    is_hd: bool
+    is_hd: bool,
+    share_identical_frames: bool = False
 ) -> Dict[str, Any]:
     source_width, source_height = source_canvas
     target_width = source_width / 2
@@ -682,8 +2388,8 @@ def export_sprite_metadata(
     frames: List[Dict[str, Any]] = []
     for sprite, position in zip(sprites, positions):
         left, top = position
-        width, height = sprite["image"].size
-        original_width, original_height = sprite["original_size"]
+        width, height = sprite.size
+        original_width, original_height = sprite.original_size
        
         left_scaled = left
         top_scaled = top
@@ -696,10 +2402,10 @@ def export_sprite_metadata(
             right_scaled = round_away_from_zero(right_scaled * scale_x)
             bottom_scaled = round_away_from_zero(bottom_scaled * scale_y)
 
-        old_frame_json = sprite.get("old_frame_json", None)
+        old_frame_json = sprite.old_frame_json
         if old_frame_json == None:
-            trim_left, trim_top = sprite["trim_offset"]
-            recover_cropped_offset = sprite["recover_cropped_offset"]
+            trim_left, trim_top = sprite.trim_offset
+            recover_cropped_offset = sprite.recover_cropped_offset
             recover_x, recover_y = recover_cropped_offset
             if not recover_x:
                 trim_left = 0
@@ -716,7 +2422,7 @@ def export_sprite_metadata(
 
     
 
-            extra_offset_x, extra_offset_y = sprite["offset"]
+            extra_offset_x, extra_offset_y = sprite.offset
             origin_offset_x = original_width / 2.0 - trim_left
             origin_offset_y = original_height - trim_top
 
@@ -757,10 +2463,23 @@ def export_sprite_metadata(
 
         frames.append(frame_values)
 
+    frame_index_map = list(range(len(frames)))
+    if share_identical_frames:
+        # Uses of a frame that end up with the same Rect and Offset share one entry.
+        shared_frames: List[Dict[str, Any]] = []
+        shared_index: Dict[str, int] = {}
+        for index, frame_values in enumerate(frames):
+            key = json.dumps(frame_values, sort_keys=True)
+            if key not in shared_index:
+                shared_index[key] = len(shared_frames)
+                shared_frames.append(frame_values)
+            frame_index_map[index] = shared_index[key]
+        frames = shared_frames
+
     frame_index = 0
     named_animations = []
     for animation in animations:
-        frame_str = ",".join(str(index) for index in animation["frames"])
+        frame_str = ",".join(str(frame_index_map[index]) for index in animation["frames"])
         named_animations.append({
             "Name": animation["name"],
             "Frames": frame_str,
@@ -777,34 +2496,107 @@ def export_sprite_metadata(
 
     return payload
 
-def main() -> None:
-    base_config_json = copy.deepcopy(DEFAULT_MAIN_CONFIG)
-    base_config_json_overrides = load_config(pathlib.Path(CONFIG_PATH))
-    base_config_json = deep_merge(base_config_json, base_config_json_overrides)
+def parse_arguments(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate Mario Multiverse sprite sheet resources from raw frames.")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes used to process frames (0 uses every core, 1 processes serially).",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=pathlib.Path,
+        default=None,
+        help="Directory of the processed frame cache shared by every subject. Caching is off when omitted.",
+    )
+    parser.add_argument(
+        "--cache-size-mb",
+        type=float,
+        default=DEFAULT_FRAME_CACHE_SIZE_MB,
+        help="Size limit of the processed frame cache; the least recently used frames are evicted first.",
+    )
+    parser.add_argument(
+        "--decode-cache",
+        action="store_true",
+        help="Keep every raw frame decoded as an uncompressed .npy file under <subject>/.decoded/ and memory-map "
+             "it on later runs instead of decoding the PNG again. Entries follow the source's size and "
+             "modification time.",
+    )
+    parser.add_argument(
+        "--sheet-mode",
+        choices=SHEET_MODES,
+        default="memory",
+        help="'stream' spills cropped frames to disk and builds and encodes the sheets band by band; "
+             "'auto' streams when the estimated frame and sheet memory exceeds --memory-budget-mb.",
+    )
+    parser.add_argument(
+        "--memory-budget-mb",
+        type=float,
+        default=DEFAULT_MEMORY_BUDGET_MB,
+        help="Memory budget used by --sheet-mode auto.",
+    )
+    parser.add_argument(
+        "--band-height",
+        type=int,
+        default=DEFAULT_BAND_HEIGHT,
+        help="Rows composed and encoded at a time by the streaming sheet mode.",
+    )
+    parser.add_argument(
+        "--frame-output",
+        choices=FRAME_OUTPUT_MODES,
+        default="async",
+        help="How the per-frame files in generated/<animation>/ are written: 'async' encodes PNGs on background "
+             "threads, 'png' synchronously, 'npy' as raw arrays, 'none' skips them (regenerate=false then needs "
+             "--preserve-source sheet).",
+    )
+    parser.add_argument(
+        "--preserve-source",
+        choices=PRESERVE_SOURCES,
+        default="frames",
+        help="Where animations with regenerate=false get their pixels: 'frames' reads generated/<animation>/, "
+             "'sheet' decodes the previous sheet once and slices the frames out by their old Rects (falling back "
+             "to 'frames' when the previous sheet or .sprite file is missing).",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and regenerate whenever the subject's config.json or raw/ frames change. Animations "
+             "whose frames and config.json did not change reuse their processed frames from memory.",
+    )
+    parser.add_argument(
+        "--watch-debounce",
+        type=float,
+        default=DEFAULT_WATCH_DEBOUNCE_SECONDS,
+        help="Seconds the sources must stay unchanged before watch mode regenerates.",
+    )
+    parser.add_argument(
+        "--profile",
+        type=pathlib.Path,
+        default=None,
+        help="Write a per-stage, per-animation and per-frame timing summary to this JSON file and a Chrome "
+             "trace-event file next to it (<name>.trace.json).",
+    )
+    return parser.parse_args(argv)
 
-    game_theme = base_config_json.get("game_theme")
-    subject_name = base_config_json.get("subject")
-    is_hd = base_config_json.get("is_hd", True)
 
-    if game_theme:
-        theme_config_json = copy.deepcopy(DEFAULT_GAME_THEME_CONFIG)
-        theme_dir = pathlib.Path(game_theme)
-        theme_config_json_path = theme_dir / GAME_THEME_CONFIG_FILENAME
-        if theme_config_json_path.exists():
-            theme_config_json_override = load_config(theme_config_json_path)
-            theme_config_json = deep_merge(theme_config_json, theme_config_json_override)
-        theme_subject = theme_config_json.get("subject")
-        is_hd = theme_config_json.get("is_hd", True)
-        if theme_subject:
-            subject_name = theme_subject
+def resolve_jobs(jobs: int) -> int:
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
 
-    if not subject_name:
-        raise SystemExit("The 'subject' field must be specified in the config.json.")
 
-    subject_path = pathlib.Path(subject_name)
-    if game_theme:
-        subject_path = pathlib.Path(game_theme) / subject_path
+def discover_subjects(base_dir: pathlib.Path) -> List[str]:
+    if not base_dir.is_dir():
+        return []
+    subjects = []
+    for entry in sorted(base_dir.iterdir(), key=lambda item: item.name.lower()):
+        if entry.is_dir() and is_subject_directory_name(entry.name):
+            subjects.append(entry.name)
+    return subjects
+
 
+def load_subject_config(subject_path: pathlib.Path) -> SubjectConfig:
     subject_config_json_path = subject_path / "config.json"
     subject_config_json = json.loads(json.dumps(DEFAULT_SUBJECT_CONFIG))
     subject_config_json_override = load_config(subject_config_json_path)
@@ -821,17 +2613,78 @@ def main() -> None:
     forced_width = int(forced_width) if forced_width is not None else None
     forced_height = int(forced_height) if forced_height is not None else None
 
-    subject_config = SubjectConfig(resize_to_percent, background_color, color_threshold, remove_background, crop_sprites, (forced_width, forced_height))
+    deduplicate_frames = bool(subject_config_json.get("deduplicate_frames"))
+    try:
+        duplicate_tolerance = float(subject_config_json.get("duplicate_tolerance") or 0)
+    except (TypeError, ValueError) as exc:
+        raise ConfigError(f"Invalid duplicate_tolerance in {subject_config_json_path}.") from exc
+
+    sheet_packer = sheet_config.get("packer") or "shelf"
+    if sheet_packer not in PACKER_CHOICES:
+        raise ConfigError(f"Unsupported sheet packer in {subject_config_json_path}: {sheet_packer!r}")
+
+    return SubjectConfig(resize_to_percent, background_color, color_threshold, remove_background, crop_sprites, (forced_width, forced_height), sheet_packer, deduplicate_frames, duplicate_tolerance)
+
 
-    reduce_file_size = bool(base_config_json["reduce_file_size"])
+@dataclass
+class GenerationResult:
+    subject: str
+    output_dir: pathlib.Path
+    sheet_path: pathlib.Path
+    half_sheet_path: Optional[pathlib.Path]
+    sprite_file: pathlib.Path
+    sheet_size: Tuple[int, int]
+    half_sheet_size: Optional[Tuple[int, int]]
+    frames: int
+    unique_frames: int
+    packer: str
+    occupancy: float
+    reused_animations: List[str]
+
+
+def generate_subject(
+    subject_path: pathlib.Path,
+    subject_name: str,
+    is_hd: bool,
+    reduce_file_size: bool,
+    executor: Optional[Executor] = None,
+    frame_cache: Optional[FrameCache] = None,
+    sheet_mode: str = "memory",
+    memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_MB * 1024 * 1024,
+    band_height: int = DEFAULT_BAND_HEIGHT,
+    profiler: Any = NULL_PROFILER,
+    frame_output: str = "async",
+    animation_cache: Optional[AnimationCache] = None,
+    subject_config: Optional[SubjectConfig] = None,
+    progress: Optional[GenerationProgress] = None,
+    preserve_source: str = "frames",
+    decode_cache: bool = False,
+    workers: int = 1
+) -> GenerationResult:
+    if sheet_mode not in SHEET_MODES:
+        raise ConfigError(f"Unsupported sheet mode: {sheet_mode}")
+    if frame_output not in FRAME_OUTPUT_MODES:
+        raise ConfigError(f"Unsupported frame output: {frame_output}")
+    if preserve_source not in PRESERVE_SOURCES:
+        raise ConfigError(f"Unsupported preserve source: {preserve_source}")
+
+    if progress is None:
+        progress = GenerationProgress()
+    if subject_config is None:
+        subject_config = load_subject_config(subject_path)
+    resize_to_percent = subject_config.resize_to_percent
+    forced_width, forced_height = subject_config.sheet_dimensions
+    sheet_packer = subject_config.sheet_packer
+    deduplicate_frames = subject_config.deduplicate_frames
+    duplicate_tolerance = subject_config.duplicate_tolerance
 
     input_dir = subject_path / "raw"
 
     if not input_dir.exists():
-        raise SystemExit(f"Input directory not found: {input_dir}")
+        raise InputError(f"Input directory not found: {input_dir}")
 
     output_dir = subject_path / "generated"
-
+    decoded_cache = DecodedFrameCache(subject_path / DECODED_FRAME_DIR) if decode_cache else None
 
     sprite_file_path = output_dir / (subject_name + ".sprite")
 
@@ -845,120 +2698,489 @@ def main() -> None:
         if not animation_config.regenerate:
             preserve_dirs.add(animation_dir.name)
 
+    spritesheet_path = output_dir / (subject_name + ".png")
+    spritesheet_path_2x = spritesheet_path
+    if is_hd:
+        spritesheet_path_2x = output_dir / (subject_name + "@2x.png")
+
     sub_positions = ""
+    # Preserved frames come from the previous sheet when asked to and both it
+    # and its .sprite file are still there, and from their frame files otherwise.
+    previous_sheet: Optional[SheetSliceArena] = None
     if len(preserve_dirs) > 0:
         previous_sprite_file = load_previous_sprite_metadata(sprite_file_path, preserve_dirs)
         if previous_sprite_file != None and previous_sprite_file.sub_positions != None:
             sub_positions = previous_sprite_file.sub_positions
-        
-
-    processed_sprites: List[Dict[str, Any]] = []
+        if preserve_source == "sheet" and previous_sprite_file != None and spritesheet_path_2x.is_file():
+            previous_sheet = SheetSliceArena(spritesheet_path_2x)
+
+    stream_sheet = sheet_mode == "stream"
+    if sheet_mode == "auto":
+        estimated_bytes = 0
+        for animation_dir in animation_dirs:
+            if animation_config_by_dir[animation_dir].regenerate:
+                estimated_bytes += estimate_frame_bytes(collect_sprite_paths(animation_dir), resize_to_percent)
+            elif previous_sheet is None and (output_dir / animation_dir.name).is_dir():
+                estimated_bytes += estimate_frame_bytes(collect_intermediate_frame_paths(output_dir / animation_dir.name), None)
+        if previous_sheet is not None:
+            # The previous sheet stays decoded while preserved frames are pasted.
+            estimated_bytes += previous_sheet.size[0] * previous_sheet.size[1] * 4
+        # The frames, a full sheet at least as large as them and its half-res copy.
+        stream_sheet = estimated_bytes * 2.25 > memory_budget_bytes
+    spill_store = FrameSpillStore() if stream_sheet else None
+
+    processed_sprites: List[SpriteRecord] = []
 
     animations_meta: List[Dict[str, Any]] = []
     frame_index = 0
 
-    if output_dir.exists():
-        for child in list(output_dir.iterdir()):
-            if child.is_dir() and child.name in preserve_dirs:
+    # Animations whose processed sprites are still in memory from an earlier
+    # run keep their generated/ folders as they are.
+    reused_sprites: Dict[str, List[SpriteRecord]] = {}
+    animation_fingerprints: Dict[str, Tuple[Any, ...]] = {}
+    if animation_cache is not None:
+        settings = frame_processing_settings(subject_config, is_hd, reduce_file_size)
+        animation_cache.retain([animation_dir.name for animation_dir in animation_dirs])
+        for animation_dir in animation_dirs:
+            if not animation_config_by_dir[animation_dir].regenerate:
                 continue
-            if child.is_dir():
-                shutil.rmtree(child, ignore_errors=True)
-
-    for animation_dir in animation_dirs:
-        animation_name = animation_dir.name
-        animation_config = animation_config_by_dir[animation_dir]   
-
-        sprites: Optional[List[Dict[str, Any]]]
-        if animation_config.regenerate:
-            sprite_paths = collect_sprite_paths(animation_dir)
+            fingerprint = AnimationCache.fingerprint(animation_dir, settings)
+            animation_fingerprints[animation_dir.name] = fingerprint
+            cached_sprites = animation_cache.get(animation_dir.name, fingerprint)
+            if cached_sprites is not None and (frame_output == "none" or (output_dir / animation_dir.name).is_dir()):
+                reused_sprites[animation_dir.name] = cached_sprites
+
+    progress.start(sum(
+        len(collect_sprite_paths(animation_dir))
+        for animation_dir in animation_dirs
+        if animation_config_by_dir[animation_dir].regenerate and animation_dir.name not in reused_sprites
+    ))
+
+    # Everything is written to a staging folder that replaces generated/ only
+    # once the run succeeds, so a failed or cancelled run leaves the previous
+    # output untouched.
+    staging_dir = begin_staged_output(output_dir, sorted(preserve_dirs | set(reused_sprites)))
+    half_canvas_size: Optional[Tuple[int, int]] = None
+    try:
+        frame_writer = FrameWriter(frame_output)
+        try:
+            for animation_dir in animation_dirs:
+                animation_name = animation_dir.name
+                animation_config = animation_config_by_dir[animation_dir]   
+
+                sprites: Optional[List[SpriteRecord]]
+                progress.begin_animation(animation_name)
+                with profiler.stage("animation", animation=animation_name, regenerate=animation_config.regenerate) as span:
+                    if animation_name in reused_sprites:
+                        sprites = reused_sprites[animation_name]
+                    elif animation_config.regenerate:
+                        sprite_paths = collect_sprite_paths(animation_dir)
   
-            sprites = process_sprites(
-                sprite_paths,
-                output_dir / animation_name,
-                reduce_file_size,
-                subject_config,
-                animation_config,
-                is_hd
+                        sprites = process_sprites(
+                            sprite_paths,
+                            staging_dir / animation_name,
+                            reduce_file_size,
+                            subject_config,
+                            animation_config,
+                            is_hd,
+                            executor,
+                            frame_cache,
+                            profiler,
+                            frame_writer,
+                            progress,
+                            decoded_cache,
+                            workers
+                        )
+                        if animation_cache is not None:
+                            animation_cache.put(animation_name, animation_fingerprints[animation_name], sprites)
+                    else:
+
+                        previous_frame_values = None
+                        if previous_sprite_file != None:
+                            previous_frame_values = previous_sprite_file.frames[animation_name]
+                        if previous_sheet is not None:
+                            sprites = load_sheet_sprites(previous_sheet, previous_frame_values, animation_config, is_hd)
+                        else:
+                            sprites = load_existing_sprites(
+                                output_dir / animation_name,
+                                previous_frame_values,
+                                animation_config
+                            )
+                        if sprites is None:
+                            raise InputError(
+                                f"No generated frames to preserve in {output_dir / animation_name}; "
+                                "regenerate this animation once with frame output enabled."
+                            )
+                    span.add("frames", len(sprites))
+
+                    if spill_store is not None:
+                        spill_sprites(sprites, spill_store)
+                processed_sprites.extend(sprites)
+
+                frame_range = list(range(frame_index, frame_index + len(sprites)))
+
+                animations_meta.append({
+                    "name": animation_name,
+                    "frames": frame_range,
+                    "delay": animation_config.delay,
+                })
+                frame_index += len(sprites)
+        finally:
+            frame_writer.close()
+
+
+        progress.stage("layout")
+        sheet_sprites: List[SpriteRecord] = processed_sprites
+        sheet_index_by_use: Optional[List[int]] = None
+        if deduplicate_frames:
+            with profiler.stage("deduplicate_sprites", frames=len(processed_sprites)):
+                sheet_sprites, sheet_index_by_use = deduplicate_sprites(processed_sprites, duplicate_tolerance)
+
+        with profiler.stage("select_layout", frames=len(sheet_sprites), packer=sheet_packer) as span:
+            layout_info = select_layout(sheet_sprites, forced_width, forced_height, is_hd, sheet_packer)
+            span.add("pixels", layout_info["canvas_width"] * layout_info["canvas_height"])
+        sheet_positions = layout_info["positions"]
+        if any(position is None for position in sheet_positions):
+            raise LayoutError("Failed to generate positions for every sprite.")
+        final_positions = sheet_positions
+        if sheet_index_by_use is not None:
+            final_positions = [sheet_positions[index] for index in sheet_index_by_use]
+
+        canvas_size = (layout_info["canvas_width"], layout_info["canvas_height"])
+
+
+        progress.stage("sheet")
+        sheet_image: Optional[Image.Image] = None
+        if not stream_sheet:
+            with profiler.stage("create_sprite_sheet", pixels=canvas_size[0] * canvas_size[1]):
+                sheet_image = create_sprite_sheet(
+                    sheet_sprites,
+                    sheet_positions,
+                    canvas_size,
+                )
+
+        with profiler.stage("export_sprite_metadata", frames=len(processed_sprites)):
+            payload = export_sprite_metadata(
+                processed_sprites,
+                final_positions,
+                canvas_size,
+                animations_meta,
+                sub_positions,
+                is_hd,
+                deduplicate_frames
             )
+
+        progress.stage("write")
+        staged_sheet_path = staging_dir / spritesheet_path.name
+        staged_sheet_path_2x = staging_dir / spritesheet_path_2x.name
+        staged_sprite_file = staging_dir / sprite_file_path.name
+
+        def write_sprite_file() -> None:
+            with profiler.stage("write_sprite_file") as span:
+                with staged_sprite_file.open("w", encoding="utf-8") as handle:
+                    json.dump(payload, handle, indent=2)
+                if profiler.enabled:
+                    span.add("bytes_written", staged_sprite_file.stat().st_size)
+
+        if stream_sheet:
+            def write_sheets_streaming() -> Optional[Tuple[int, int]]:
+                with profiler.stage("write_sprite_sheets_streaming", pixels=canvas_size[0] * canvas_size[1]) as span:
+                    half_size = write_sprite_sheets_streaming(
+                        sheet_sprites,
+                        sheet_positions,
+                        canvas_size,
+                        staged_sheet_path_2x,
+                        staged_sheet_path if is_hd else None,
+                        reduce_file_size,
+                        band_height
+                    )
+                    if profiler.enabled:
+                        span.add("bytes_written", staged_sheet_path_2x.stat().st_size)
+                        if is_hd:
+                            span.add("bytes_written", staged_sheet_path.stat().st_size)
+                return half_size
+
+            half_canvas_size = run_concurrently([write_sheets_streaming, write_sprite_file])[0]
         else:
+            jobs: List[Callable[[], Any]] = []
+            if is_hd:
+                # NEAREST halving is a stride copy in C, cheap next to encoding,
+                # so it runs inside the half sheet's job.
+                half_canvas_size = (max(1, (sheet_image.width + 1) // 2), max(1, (sheet_image.height + 1) // 2))
+
+                def save_half_sheet() -> None:
+                    with profiler.stage("save_half_sheet", pixels=half_canvas_size[0] * half_canvas_size[1]) as span:
+                        sheet_image.resize(half_canvas_size, RESAMPLE_NEAREST).save(staged_sheet_path)
+                        if profiler.enabled:
+                            span.add("bytes_written", staged_sheet_path.stat().st_size)
+
+                jobs.append(save_half_sheet)
+
+            def save_sheet() -> None:
+                with profiler.stage("save_sheet", pixels=canvas_size[0] * canvas_size[1]) as span:
+                    sheet_image.save(staged_sheet_path_2x, format="PNG", optimize=reduce_file_size)
+                    if profiler.enabled:
+                        span.add("bytes_written", staged_sheet_path_2x.stat().st_size)
+
+            jobs.extend((save_sheet, write_sprite_file))
+            run_concurrently(jobs)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    finally:
+        if spill_store is not None:
+            spill_store.close()
+    commit_staged_output(staging_dir, output_dir)
+    progress.stage("done")
+
+    if half_canvas_size is not None:
+        print(f"Half-res sprite sheet saved to {spritesheet_path.resolve()} with size {half_canvas_size[0]}x{half_canvas_size[1]} pixels.")
 
-            previous_frame_values = None
-            if previous_sprite_file != None:
-                previous_frame_values = previous_sprite_file.frames[animation_name]
-            sprites = load_existing_sprites(
-                output_dir / animation_name,
-                previous_frame_values,
-                animation_config
-            )
+    print(f"Processed {len(processed_sprites)} sprites into {output_dir}.")
+    if reused_sprites:
+        print(f"Reused the processed frames of {len(reused_sprites)} unchanged animations: {', '.join(reused_sprites)}.")
+    if sheet_index_by_use is not None:
+        print(f"Deduplicated {len(processed_sprites)} frames into {len(sheet_sprites)} unique images and {len(payload['Frames'])} frame entries.")
+    print(f"Sheet layout packed with {layout_info['packer']} at {layout_info['occupancy']:.1%} occupancy.")
+    print(f"High-res sprite sheet saved to {spritesheet_path_2x.resolve()} with size {canvas_size[0]}x{canvas_size[1]} pixels.")
+    print(f"Offset metadata saved to {sprite_file_path.resolve()}.")
 
-        processed_sprites.extend(sprites)
+    return GenerationResult(
+        subject=subject_name,
+        output_dir=output_dir,
+        sheet_path=spritesheet_path_2x,
+        half_sheet_path=spritesheet_path if is_hd else None,
+        sprite_file=sprite_file_path,
+        sheet_size=canvas_size,
+        half_sheet_size=half_canvas_size,
+        frames=len(processed_sprites),
+        unique_frames=len(sheet_sprites),
+        packer=layout_info["packer"],
+        occupancy=layout_info["occupancy"],
+        reused_animations=list(reused_sprites),
+    )
 
-        frame_range = list(range(frame_index, frame_index + len(sprites)))
 
-        animations_meta.append({
-            "name": animation_name,
-            "frames": frame_range,
-            "delay": animation_config.delay,
-        })
-        frame_index += len(sprites)
+@dataclass
+class GenerateOptions:
+    # Everything generate() needs besides the subject folder. subject_config
+    # overrides the subject's config.json; the executor, caches, profiler and
+    # progress reporter are shared resources the caller owns. workers is the
+    # executor's worker count.
+    is_hd: bool = True
+    reduce_file_size: bool = False
+    subject_name: Optional[str] = None
+    subject_config: Optional[SubjectConfig] = None
+    sheet_mode: str = "memory"
+    memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_MB * 1024 * 1024
+    band_height: int = DEFAULT_BAND_HEIGHT
+    frame_output: str = "async"
+    executor: Optional[Executor] = None
+    frame_cache: Optional[FrameCache] = None
+    animation_cache: Optional[AnimationCache] = None
+    profiler: Any = NULL_PROFILER
+    progress: Optional[GenerationProgress] = None
+    preserve_source: str = "frames"
+    decode_cache: bool = False
+    workers: int = 1
+
+
+def generate(subject_path: pathlib.Path, options: Optional[GenerateOptions] = None) -> GenerationResult:
+    # Library entry point: builds one subject folder without touching the
+    # working directory or the root config.json, and raises GeneratorError
+    # subclasses instead of exiting.
+    if options is None:
+        options = GenerateOptions()
+    subject_path = pathlib.Path(subject_path)
+    return generate_subject(
+        subject_path,
+        options.subject_name or subject_path.name,
+        options.is_hd,
+        options.reduce_file_size,
+        options.executor,
+        options.frame_cache,
+        options.sheet_mode,
+        options.memory_budget_bytes,
+        options.band_height,
+        options.profiler,
+        options.frame_output,
+        options.animation_cache,
+        options.subject_config,
+        options.progress,
+        options.preserve_source,
+        options.decode_cache,
+        options.workers
+    )
 
 
-    layout_info = select_layout(processed_sprites, forced_width, forced_height, is_hd)
-    final_positions = layout_info["positions"]
-    if any(position is None for position in final_positions):
-        raise SystemExit("Failed to generate positions for every sprite.")
+@dataclass
+class GenerationTarget:
+    subject_path: pathlib.Path
+    subject_name: str
+    is_hd: bool
+    reduce_file_size: bool
 
-    canvas_size = (layout_info["canvas_width"], layout_info["canvas_height"])
 
+def load_generation_target(root_dir: pathlib.Path) -> GenerationTarget:
+    # The subject the root config.json (and its game theme's config.json)
+    # selects, with paths relative to root_dir.
+    base_config_json = copy.deepcopy(DEFAULT_MAIN_CONFIG)
+    base_config_json_overrides = load_config(root_dir / CONFIG_PATH)
+    base_config_json = deep_merge(base_config_json, base_config_json_overrides)
 
-    sheet_image = create_sprite_sheet(
-        processed_sprites,
-        final_positions,
-        canvas_size,
-    )
+    game_theme = base_config_json.get("game_theme")
+    subject_name = base_config_json.get("subject")
+    is_hd = base_config_json.get("is_hd", True)
 
-    payload = export_sprite_metadata(
-        processed_sprites,
-        final_positions,
-        canvas_size,
-        animations_meta,
-        sub_positions,
-        is_hd
-    )
+    if game_theme:
+        theme_config_json = copy.deepcopy(DEFAULT_GAME_THEME_CONFIG)
+        theme_dir = root_dir / game_theme
+        theme_config_json_path = theme_dir / GAME_THEME_CONFIG_FILENAME
+        if theme_config_json_path.exists():
+            theme_config_json_override = load_config(theme_config_json_path)
+            theme_config_json = deep_merge(theme_config_json, theme_config_json_override)
+        theme_subject = theme_config_json.get("subject")
+        is_hd = theme_config_json.get("is_hd", True)
+        if theme_subject:
+            subject_name = theme_subject
 
-    if output_dir.exists():
-        for child in list(output_dir.iterdir()):
-            if not child.is_dir():
-                try:
-                    child.unlink()
-                except FileNotFoundError:
-                    pass
+    if not subject_name:
+        raise ConfigError("The 'subject' field must be specified in the config.json.")
 
-    output_dir.mkdir(parents=True, exist_ok=True)
+    subject_path = root_dir / subject_name
+    if game_theme:
+        subject_path = root_dir / game_theme / subject_name
+    return GenerationTarget(subject_path, subject_name, bool(is_hd), bool(base_config_json["reduce_file_size"]))
+
+
+def snapshot_subject_sources(subject_path: pathlib.Path) -> Dict[str, Tuple[int, int]]:
+    # Size and modification time of the subject config.json and everything
+    # under raw/; generated/ is left out since every run rewrites it.
+    snapshot: Dict[str, Tuple[int, int]] = {}
+    paths = [subject_path / "config.json"]
+    for directory, _, filenames in os.walk(subject_path / "raw"):
+        paths.extend(pathlib.Path(directory) / filename for filename in filenames)
+    for path in paths:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        snapshot[str(path.relative_to(subject_path))] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+def describe_source_changes(before: Dict[str, Tuple[int, int]], after: Dict[str, Tuple[int, int]]) -> str:
+    changed = sorted(name for name in set(before) | set(after) if before.get(name) != after.get(name))
+    listed = ", ".join(changed[:5])
+    if len(changed) > 5:
+        listed += f" and {len(changed) - 5} more"
+    return listed
+
+
+def watch_subject(
+    subject_path: pathlib.Path,
+    run: Callable[[], Any],
+    debounce_seconds: float = DEFAULT_WATCH_DEBOUNCE_SECONDS,
+    poll_seconds: float = WATCH_POLL_SECONDS
+) -> None:
+    # Polls the subject's sources and calls run once they have stopped
+    # changing for debounce_seconds. A failed run is reported and watching
+    # goes on; Ctrl+C stops it.
+    previous = snapshot_subject_sources(subject_path)
+    try:
+        run()
+    except GeneratorError as exc:
+        print(f"Generation failed: {exc}")
+    except Exception as exc:
+        # e.g. a raw frame read while it was still being saved.
+        print(f"Generation failed: {type(exc).__name__}: {exc}")
+    print(f"Watching {subject_path.resolve()} for changes. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(poll_seconds)
+            current = snapshot_subject_sources(subject_path)
+            if current == previous:
+                continue
+            stable_since = time.monotonic()
+            while time.monotonic() - stable_since < debounce_seconds:
+                time.sleep(poll_seconds)
+                latest = snapshot_subject_sources(subject_path)
+                if latest != current:
+                    current = latest
+                    stable_since = time.monotonic()
+            print(f"Changed: {describe_source_changes(previous, current)}")
+            previous = current
+            started = time.perf_counter()
+            try:
+                run()
+            except GeneratorError as exc:
+                print(f"Generation failed: {exc}")
+                continue
+            except Exception as exc:
+                print(f"Generation failed: {type(exc).__name__}: {exc}")
+                continue
+            print(f"Regenerated in {time.perf_counter() - started:.1f}s.")
+    except KeyboardInterrupt:
+        print("Stopped watching.")
 
-    spritesheet_path = output_dir / (subject_name + ".png")
-    spritesheet_path_2x = spritesheet_path
-    spritesheet_path.parent.mkdir(parents=True, exist_ok=True)
 
-    if is_hd:
-        half_width = max(1, (sheet_image.width + 1) // 2)
-        half_height = max(1, (sheet_image.height + 1) // 2)
-        half_canvas_size = (half_width, half_height)
-        sheet_half = sheet_image.resize(half_canvas_size, RESAMPLE_NEAREST)
-        sheet_half.save(spritesheet_path)
-        spritesheet_path_2x = output_dir / (subject_name + "@2x.png")
-        print(f"Half-res sprite sheet saved to {spritesheet_path.resolve()} with size {half_canvas_size[0]}x{half_canvas_size[1]} pixels.")
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    arguments = parse_arguments(argv)
+    jobs = resolve_jobs(arguments.jobs)
+    frame_cache: Optional[FrameCache] = None
+    if arguments.cache_dir is not None:
+        frame_cache = FrameCache(arguments.cache_dir, int(arguments.cache_size_mb * 1024 * 1024))
 
-    sheet_image.save(spritesheet_path_2x, format="PNG", optimize=reduce_file_size)
+    try:
+        target = load_generation_target(pathlib.Path("."))
+    except GeneratorError as exc:
+        raise SystemExit(str(exc)) from exc
+
+    profiler = StageProfiler() if arguments.profile is not None else NULL_PROFILER
+    animation_cache = AnimationCache() if arguments.watch else None
+    executor: Optional[Executor] = None
+    if jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+
+    options = GenerateOptions(
+        is_hd=target.is_hd,
+        reduce_file_size=target.reduce_file_size,
+        subject_name=target.subject_name,
+        sheet_mode=arguments.sheet_mode,
+        memory_budget_bytes=int(arguments.memory_budget_mb * 1024 * 1024),
+        band_height=arguments.band_height,
+        frame_output=arguments.frame_output,
+        preserve_source=arguments.preserve_source,
+        decode_cache=arguments.decode_cache,
+        executor=executor,
+        workers=jobs,
+        frame_cache=frame_cache,
+        animation_cache=animation_cache,
+        profiler=profiler,
+    )
 
+    def run() -> GenerationResult:
+        with profiler.stage("generate_subject", subject=target.subject_name):
+            return generate(target.subject_path, options)
 
+    try:
+        if arguments.watch:
+            watch_subject(target.subject_path, run, arguments.watch_debounce)
+        else:
+            run()
+    except GeneratorError as exc:
+        raise SystemExit(str(exc)) from exc
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if frame_cache is not None:
+        print(frame_cache.summary())
+    if arguments.profile is not None:
+        trace_path = profiler.write(arguments.profile)
+        print(f"Profile saved to {arguments.profile.resolve()} and trace to {trace_path.resolve()}.")
 
-    with sprite_file_path.open("w", encoding="utf-8") as handle:
-        json.dump(payload, handle, indent=2)
 
-    print(f"Processed {len(processed_sprites)} sprites into {output_dir}.")
-    print(f"High-res sprite sheet saved to {spritesheet_path_2x.resolve()} with size {canvas_size[0]}x{canvas_size[1]} pixels.")
-    print(f"Offset metadata saved to {sprite_file_path.resolve()}.")
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
 
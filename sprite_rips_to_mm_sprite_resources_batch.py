@@ -0,0 +1,496 @@
+import argparse
+import contextlib
+import copy
+import json
+import multiprocessing
+import pathlib
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sprite_rips_to_mm_sprite_resources import (
+    CONFIG_PATH,
+    DEFAULT_FRAME_CACHE_SIZE_MB,
+    DEFAULT_GAME_THEME_CONFIG,
+    DEFAULT_MAIN_CONFIG,
+    DEFAULT_MEMORY_BUDGET_MB,
+    FRAME_OUTPUT_MODES,
+    GAME_THEME_CONFIG_FILENAME,
+    NULL_PROFILER,
+    PRESERVE_SOURCES,
+    FrameCache,
+    GenerateOptions,
+    GeneratorError,
+    StageProfiler,
+    collect_animation_directories,
+    collect_sprite_paths,
+    deep_merge,
+    discover_subjects,
+    generate,
+    load_animation_config,
+    load_config,
+    load_subject_config,
+    read_frame_size,
+    resized_dimensions,
+    resolve_jobs,
+)
+
+NO_THEME = "None"
+# Frame cache opened once by each subject worker process.
+_worker_frame_cache: Optional[FrameCache] = None
+
+
+@dataclass
+class SubjectTarget:
+    game_theme: Optional[str]
+    subject: str
+    subject_path: pathlib.Path
+    is_hd: bool
+
+
+@dataclass
+class SubjectEstimate:
+    frames: int
+    pixels: int
+    memory_bytes: int
+
+
+def _load_optional_config(path: pathlib.Path, defaults: Dict[str, Any]) -> Dict[str, Any]:
+    config = copy.deepcopy(defaults)
+    if path.exists() and path.stat().st_size > 0:
+        config = deep_merge(config, load_config(path))
+    return config
+
+
+def _normalize_is_hd(value: Any) -> bool:
+    return True if value is None else bool(value)
+
+
+def find_subject_targets(
+    root_dir: pathlib.Path,
+    themes: Optional[Sequence[str]] = None,
+    subjects: Optional[Sequence[str]] = None
+) -> List[SubjectTarget]:
+    # Folders directly under the root that hold a raw/ folder are subjects
+    # without a game theme; every other folder is treated as a game theme.
+    root_config = _load_optional_config(root_dir / CONFIG_PATH, DEFAULT_MAIN_CONFIG)
+    theme_filter = set(themes) if themes else None
+    subject_filter = set(subjects) if subjects else None
+
+    targets: List[SubjectTarget] = []
+    for entry_name in discover_subjects(root_dir):
+        entry_path = root_dir / entry_name
+        if (entry_path / "raw").is_dir():
+            if theme_filter is not None and NO_THEME not in theme_filter:
+                continue
+            if subject_filter is not None and entry_name not in subject_filter:
+                continue
+            targets.append(SubjectTarget(None, entry_name, entry_path, _normalize_is_hd(root_config.get("is_hd"))))
+            continue
+
+        if theme_filter is not None and entry_name not in theme_filter:
+            continue
+        theme_config = _load_optional_config(entry_path / GAME_THEME_CONFIG_FILENAME, DEFAULT_GAME_THEME_CONFIG)
+        is_hd = _normalize_is_hd(theme_config.get("is_hd"))
+        for subject_name in discover_subjects(entry_path):
+            subject_path = entry_path / subject_name
+            if not (subject_path / "raw").is_dir():
+                continue
+            if subject_filter is not None and subject_name not in subject_filter:
+                continue
+            targets.append(SubjectTarget(entry_name, subject_name, subject_path, is_hd))
+    return targets
+
+
+def estimate_subject(target: SubjectTarget) -> SubjectEstimate:
+    # Frames x pixel area of the animations the subject regenerates, taken
+    # from the PNG header of each animation's first frame. The memory estimate
+    # follows --sheet-mode auto: the processed frames, a sheet at least as
+    # large and its half-res copy, plus one decoded raw frame.
+    frames = pixels = frame_bytes = largest_frame = 0
+    try:
+        subject_config = load_subject_config(target.subject_path)
+        percent = subject_config.resize_to_percent
+        for animation_dir in collect_animation_directories(target.subject_path / "raw"):
+            if not load_animation_config(animation_dir, target.is_hd).regenerate:
+                continue
+            sprite_paths = collect_sprite_paths(animation_dir)
+            if not sprite_paths:
+                continue
+            width, height = read_frame_size(sprite_paths[0])
+            frames += len(sprite_paths)
+            pixels += len(sprite_paths) * width * height
+            largest_frame = max(largest_frame, width * height * 4)
+            if not (percent == 100 or percent == None):
+                width, height = resized_dimensions((width, height), percent)
+            frame_bytes += len(sprite_paths) * width * height * 4
+    except (GeneratorError, OSError):
+        # The subject still runs and reports its error; it just goes last.
+        return SubjectEstimate(0, 0, 0)
+    return SubjectEstimate(frames, pixels, int(frame_bytes * 2.25) + largest_frame)
+
+
+def build_target(
+    target: SubjectTarget,
+    reduce_file_size: bool,
+    executor: Optional[Executor] = None,
+    frame_cache: Optional[FrameCache] = None,
+    profiler: Any = NULL_PROFILER,
+    frame_output: str = "async",
+    preserve_source: str = "frames",
+    decode_cache: bool = False,
+    workers: int = 1
+) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {
+        "game_theme": target.game_theme,
+        "subject": target.subject,
+        "path": str(target.subject_path),
+    }
+    started = time.perf_counter()
+    try:
+        # The generator reports progress on stdout, which is reserved for the summary.
+        with contextlib.redirect_stdout(sys.stderr), profiler.stage(
+            "generate_subject", game_theme=target.game_theme, subject=target.subject
+        ):
+            result = generate(target.subject_path, GenerateOptions(
+                is_hd=target.is_hd,
+                reduce_file_size=reduce_file_size,
+                subject_name=target.subject,
+                frame_output=frame_output,
+                preserve_source=preserve_source,
+                decode_cache=decode_cache,
+                executor=executor,
+                workers=workers,
+                frame_cache=frame_cache,
+                profiler=profiler,
+            ))
+    except GeneratorError as exc:
+        entry["status"] = "failed"
+        entry["error"] = str(exc)
+    except Exception as exc:
+        entry["status"] = "failed"
+        entry["error"] = f"{type(exc).__name__}: {exc}"
+    else:
+        entry["status"] = "ok"
+        entry["frames"] = result.frames
+        entry["unique_frames"] = result.unique_frames
+        entry["sheet_size"] = list(result.sheet_size)
+        entry["packer"] = result.packer
+        entry["occupancy"] = round(result.occupancy, 4)
+    entry["seconds"] = round(time.perf_counter() - started, 4)
+    return entry
+
+
+def build_targets(
+    targets: Sequence[SubjectTarget],
+    reduce_file_size: bool,
+    executor: Optional[Executor] = None,
+    frame_cache: Optional[FrameCache] = None,
+    profiler: Any = NULL_PROFILER,
+    frame_output: str = "async",
+    preserve_source: str = "frames",
+    decode_cache: bool = False,
+    workers: int = 1
+) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    batch_started = time.perf_counter()
+    for target in targets:
+        queue_seconds = time.perf_counter() - batch_started
+        entry = build_target(
+            target, reduce_file_size, executor, frame_cache, profiler, frame_output, preserve_source, decode_cache, workers
+        )
+        entry["queue_seconds"] = round(queue_seconds, 4)
+        results.append(entry)
+    return results
+
+
+def _init_subject_worker(cache_dir: Optional[pathlib.Path], cache_size_bytes: int) -> None:
+    global _worker_frame_cache
+    if cache_dir is not None:
+        _worker_frame_cache = FrameCache(cache_dir, cache_size_bytes)
+
+
+def _build_target_worker(
+    target: SubjectTarget,
+    reduce_file_size: bool,
+    profile: bool,
+    frame_output: str,
+    preserve_source: str,
+    decode_cache: bool
+) -> Tuple[Dict[str, Any], Dict[str, int], List[Dict[str, Any]]]:
+    # Frames are processed serially here; the parallelism is across subjects.
+    # Returns the frame cache counts of this subject and the profiled spans.
+    frame_cache = _worker_frame_cache
+    before = (0, 0, 0) if frame_cache is None else (frame_cache.hits, frame_cache.misses, frame_cache.evictions)
+    profiler = StageProfiler() if profile else NULL_PROFILER
+    entry = build_target(target, reduce_file_size, None, frame_cache, profiler, frame_output, preserve_source, decode_cache)
+    cache_counts: Dict[str, int] = {}
+    if frame_cache is not None:
+        cache_counts = {
+            "hits": frame_cache.hits - before[0],
+            "misses": frame_cache.misses - before[1],
+            "evictions": frame_cache.evictions - before[2],
+        }
+    return entry, cache_counts, profiler.events if profile else []
+
+
+def build_targets_largest_first(
+    targets: Sequence[SubjectTarget],
+    subject_jobs: int,
+    memory_budget_bytes: int,
+    reduce_file_size: bool,
+    cache_dir: Optional[pathlib.Path] = None,
+    cache_size_bytes: int = 0,
+    profiler: Any = NULL_PROFILER,
+    frame_output: str = "async",
+    preserve_source: str = "frames",
+    decode_cache: bool = False
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    # Builds subjects side by side on subject_jobs worker processes. Whenever
+    # a worker is free, the largest waiting subject whose memory estimate fits
+    # the budget next to the running ones starts; with nothing running the
+    # largest starts regardless, so an oversized subject runs alone. If a
+    # worker dies, the subjects running at that moment fail and the rest go
+    # on in a new pool. Results keep the order of targets.
+    estimates = [estimate_subject(target) for target in targets]
+    waiting = sorted(range(len(targets)), key=lambda index: -estimates[index].pixels)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(targets)
+    cache_counts = {"hits": 0, "misses": 0, "evictions": 0}
+    running: Dict[Future, Tuple[int, float]] = {}
+    memory_in_use = 0
+    batch_started = time.perf_counter()
+
+    def start_pool() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=subject_jobs, initializer=_init_subject_worker, initargs=(cache_dir, cache_size_bytes)
+        )
+
+    def submit(index: int) -> Future:
+        return pool.submit(
+            _build_target_worker,
+            targets[index],
+            reduce_file_size,
+            profiler.enabled,
+            frame_output,
+            preserve_source,
+            decode_cache,
+        )
+
+    pool = start_pool()
+    try:
+        while waiting or running:
+            while waiting and len(running) < subject_jobs:
+                fitting = [
+                    index for index in waiting
+                    if memory_in_use + estimates[index].memory_bytes <= memory_budget_bytes
+                ]
+                if not fitting and running:
+                    break
+                index = fitting[0] if fitting else waiting[0]
+                waiting.remove(index)
+                try:
+                    future = submit(index)
+                except BrokenProcessPool:
+                    # The futures of the dead pool still report their subjects as failed.
+                    pool.shutdown(wait=False)
+                    pool = start_pool()
+                    future = submit(index)
+                running[future] = (index, time.perf_counter())
+                memory_in_use += estimates[index].memory_bytes
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, submitted = running.pop(future)
+                memory_in_use -= estimates[index].memory_bytes
+                target = targets[index]
+                try:
+                    entry, counts, events = future.result()
+                except Exception as exc:
+                    # The worker itself died, e.g. killed for running out of memory,
+                    # which also takes down every subject running next to it.
+                    entry = {
+                        "game_theme": target.game_theme,
+                        "subject": target.subject,
+                        "path": str(target.subject_path),
+                        "status": "failed",
+                        "error": f"{type(exc).__name__}: {exc}",
+                        "seconds": round(time.perf_counter() - submitted, 4),
+                    }
+                    counts, events = {}, []
+                entry["queue_seconds"] = round(submitted - batch_started, 4)
+                entry["estimated_pixels"] = estimates[index].pixels
+                entry["estimated_memory_mb"] = round(estimates[index].memory_bytes / (1024 * 1024), 1)
+                for name, count in counts.items():
+                    cache_counts[name] += count
+                if events:
+                    profiler.add_events(events)
+                results[index] = entry
+    finally:
+        pool.shutdown()
+    return results, cache_counts
+
+
+def parse_arguments(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Generate the sprite sheet resources of every game theme and subject under a root folder."
+    )
+    parser.add_argument("root", type=pathlib.Path, help="Folder holding the subjects or game theme folders.")
+    parser.add_argument(
+        "--theme",
+        action="append",
+        dest="themes",
+        help=f"Only build this game theme (repeatable, use {NO_THEME!r} for subjects without a theme).",
+    )
+    parser.add_argument("--subject", action="append", dest="subjects", help="Only build this subject (repeatable).")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes used to process frames (0 uses every core, 1 processes serially).",
+    )
+    parser.add_argument(
+        "--subject-jobs",
+        type=int,
+        default=1,
+        help="Number of subjects built side by side, each on its own worker process and largest first (0 uses "
+             "every core, 1 builds them one after another). Cannot be combined with --jobs above 1.",
+    )
+    parser.add_argument(
+        "--memory-budget-mb",
+        type=float,
+        default=DEFAULT_MEMORY_BUDGET_MB,
+        help="Estimated memory the subjects built side by side may use together; a subject over the budget "
+             "runs alone.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=pathlib.Path,
+        default=None,
+        help="Directory of the processed frame cache shared by every subject. Caching is off when omitted.",
+    )
+    parser.add_argument(
+        "--cache-size-mb",
+        type=float,
+        default=DEFAULT_FRAME_CACHE_SIZE_MB,
+        help="Size limit of the processed frame cache; the least recently used frames are evicted first.",
+    )
+    parser.add_argument(
+        "--decode-cache",
+        action="store_true",
+        help="Keep decoded raw frames as .npy files under each <subject>/.decoded/ and memory-map them on later runs.",
+    )
+    parser.add_argument(
+        "--frame-output",
+        choices=FRAME_OUTPUT_MODES,
+        default="async",
+        help="How the per-frame files in generated/<animation>/ are written ('none' skips them).",
+    )
+    parser.add_argument(
+        "--preserve-source",
+        choices=PRESERVE_SOURCES,
+        default="frames",
+        help="Where animations with regenerate=false get their pixels: their frame files or the previous sheet.",
+    )
+    parser.add_argument("--summary", type=pathlib.Path, default=None, help="Also write the JSON summary to this file.")
+    parser.add_argument(
+        "--profile",
+        type=pathlib.Path,
+        default=None,
+        help="Write a timing profile of every subject to this JSON file and a Chrome trace-event file next to it.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    arguments = parse_arguments(argv)
+    root_dir = arguments.root.resolve()
+    if not root_dir.is_dir():
+        raise SystemExit(f"Root directory not found: {root_dir}")
+
+    try:
+        root_config = _load_optional_config(root_dir / CONFIG_PATH, DEFAULT_MAIN_CONFIG)
+        targets = find_subject_targets(root_dir, arguments.themes, arguments.subjects)
+    except GeneratorError as exc:
+        raise SystemExit(str(exc)) from exc
+    reduce_file_size = bool(root_config.get("reduce_file_size"))
+    jobs = resolve_jobs(arguments.jobs)
+    subject_jobs = resolve_jobs(arguments.subject_jobs)
+    if jobs > 1 and subject_jobs > 1:
+        raise SystemExit("--jobs and --subject-jobs cannot both be above 1.")
+
+    cache_size_bytes = int(arguments.cache_size_mb * 1024 * 1024)
+    profiler = StageProfiler() if arguments.profile is not None else NULL_PROFILER
+    started = time.perf_counter()
+    cache_counts: Optional[Dict[str, int]] = None
+    if subject_jobs > 1:
+        results, cache_counts = build_targets_largest_first(
+            targets,
+            subject_jobs,
+            int(arguments.memory_budget_mb * 1024 * 1024),
+            reduce_file_size,
+            arguments.cache_dir,
+            cache_size_bytes,
+            profiler,
+            arguments.frame_output,
+            arguments.preserve_source,
+            arguments.decode_cache,
+        )
+    else:
+        frame_cache: Optional[FrameCache] = None
+        if arguments.cache_dir is not None:
+            frame_cache = FrameCache(arguments.cache_dir, cache_size_bytes)
+        executor: Optional[Executor] = None
+        if jobs > 1:
+            executor = ProcessPoolExecutor(max_workers=jobs)
+        try:
+            results = build_targets(
+                targets,
+                reduce_file_size,
+                executor,
+                frame_cache,
+                profiler,
+                arguments.frame_output,
+                arguments.preserve_source,
+                arguments.decode_cache,
+                jobs,
+            )
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        if frame_cache is not None:
+            cache_counts = {
+                "hits": frame_cache.hits,
+                "misses": frame_cache.misses,
+                "evictions": frame_cache.evictions,
+            }
+
+    failures = [entry for entry in results if entry["status"] != "ok"]
+    summary: Dict[str, Any] = {
+        "root": str(root_dir),
+        "jobs": jobs,
+        "subject_jobs": subject_jobs,
+        "seconds": round(time.perf_counter() - started, 4),
+        "subjects": results,
+        "succeeded": len(results) - len(failures),
+        "failed": len(failures),
+    }
+    if arguments.cache_dir is not None:
+        summary["frame_cache"] = cache_counts
+
+    if arguments.profile is not None:
+        summary["profile"] = str(arguments.profile)
+        summary["trace"] = str(profiler.write(arguments.profile))
+
+    text = json.dumps(summary, indent=2)
+    print(text)
+    if arguments.summary is not None:
+        arguments.summary.write_text(text + "\n", encoding="utf-8")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
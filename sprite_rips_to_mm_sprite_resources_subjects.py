@@ -0,0 +1,7 @@
+# Which folders count as subjects (and game themes). Kept free of imports so
+# the UI can list folders without loading the generator, which exits at
+# import when Pillow is missing.
+
+
+def is_subject_directory_name(name: str) -> bool:
+    return not name.startswith((".", "_", "assets"))
@@ -1,22 +1,31 @@
+import base64
 import copy
+import io
 import json
 import os
+import queue
 import shutil
-import subprocess
 import sys
+import threading
+import time
 import tkinter as tk
 import tkinter.font as tkfont
+from collections import OrderedDict
 from pathlib import Path
 from tkinter import messagebox, ttk
 import webbrowser
+from sprite_rips_to_mm_sprite_resources_subjects import is_subject_directory_name
 DEFAULT_SUBJECT_CONFIG = {
     "resize_to_percent": 100.0,
     "background_color": "#00FF00",
     "color_threshold": 100,
     "remove_background": True,
     "crop_sprites": True,
-    "sheet": {"width": None, "height": None}
+    "deduplicate_frames": False,
+    "duplicate_tolerance": 0,
+    "sheet": {"width": None, "height": None, "packer": "shelf"}
 }
+SHEET_PACKER_OPTIONS = ("shelf", "sorted_shelf", "skyline", "maxrects", "best")
 DEFAULT_ANIMATION_CONFIG = {
     "regenerate": True,
     "delay": 1,
@@ -26,6 +35,13 @@ DEFAULT_ANIMATION_CONFIG = {
 ASSET_BUNDLE_DIR = "assets"
 GAME_THEME_CONFIG_FILENAME = "config.json"
 DEFAULT_GAME_THEME_CONFIG = {"subject": None, "is_hd": True}
+# A folder modified this recently may change again within the same mtime
+# tick, so its listing is rescanned on the next check anyway.
+SNAPSHOT_RACY_SECONDS = 2.0
+PREVIEW_SIZE = (160, 160)
+PREVIEW_CACHE_BYTES = 32 * 1024 * 1024
+# Animation delays count game frames, which run at 60 per second.
+PREVIEW_TICK_MS = 1000 / 60
 def resolve_storage_root() -> Path:
     if getattr(sys, "frozen", False):
         return Path(sys.executable).resolve().parent
@@ -34,6 +50,140 @@ def resolve_asset_source() -> Path:
     if getattr(sys, "frozen", False):
         return Path(sys._MEIPASS) / ASSET_BUNDLE_DIR
     return Path(__file__).resolve().parent / ASSET_BUNDLE_DIR
+def scan_child_directories(directory: Path):
+    # Returns the folder's mtime (None when it is missing, -1 when it was
+    # modified too recently to trust) and its sorted subfolder names.
+    try:
+        mtime = directory.stat().st_mtime_ns
+        with os.scandir(directory) as entries:
+            names = [entry.name for entry in entries if entry.is_dir()]
+    except OSError:
+        return None, []
+    if time.time() - mtime / 1e9 < SNAPSHOT_RACY_SECONDS:
+        mtime = -1
+    return mtime, sorted(names, key=str.lower)
+def rescan_changed_directories(listings: dict) -> dict:
+    # Stats every folder in a snapshot and rescans only those whose mtime
+    # moved. Safe to run off the Tk thread; the result is merged back there.
+    changed = {}
+    for directory, (mtime, _) in listings.items():
+        try:
+            current = directory.stat().st_mtime_ns
+        except OSError:
+            current = None
+        if mtime == -1 or current != mtime:
+            changed[directory] = scan_child_directories(directory)
+    return changed
+class DirectorySnapshot:
+    # In-memory subfolder listings of the theme, subject and raw folders the
+    # UI has shown, validated by the folders' mtimes.
+    def __init__(self) -> None:
+        self.listings = {}
+    def children(self, directory: Path):
+        if directory not in self.listings:
+            self.listings[directory] = scan_child_directories(directory)
+        return list(self.listings[directory][1])
+    def forget(self, directory: Path) -> None:
+        self.listings.pop(directory, None)
+    def update(self, changed: dict) -> None:
+        self.listings.update(changed)
+    def clear(self) -> None:
+        self.listings.clear()
+class ThumbnailCache:
+    # Least recently used base64 PNG thumbnails, keyed by file, mtime and size
+    # and bounded by the total length of the encoded data.
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+    def get(self, key):
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+        return data
+    def put(self, key, data: str) -> None:
+        if key in self._entries:
+            self.total_bytes -= len(self._entries.pop(key))
+        self._entries[key] = data
+        self.total_bytes += len(data)
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= len(evicted)
+def collect_preview_frame_paths(subject_dir: Path, animation: str):
+    # Prefers the processed frames in generated/<Animation>/ and falls back
+    # to the raw frames.
+    sources = (
+        (subject_dir / "generated" / animation, (".png", ".npy")),
+        (subject_dir / "raw" / animation, (".png",)),
+    )
+    for directory, extensions in sources:
+        try:
+            paths = sorted(path for path in directory.iterdir() if path.is_file() and path.suffix.lower() in extensions)
+        except OSError:
+            continue
+        if paths:
+            return paths
+    return []
+def render_thumbnail(path: Path, size) -> str:
+    # Pillow (and numpy for .npy frames) are only needed once a preview is shown.
+    from PIL import Image
+    nearest = getattr(Image, "Resampling", Image).NEAREST
+    if path.suffix.lower() == ".npy":
+        import numpy as np
+        image = Image.fromarray(np.load(path), "RGBA")
+    else:
+        with Image.open(path) as source_image:
+            image = source_image.convert("RGBA")
+    # Small sprites are enlarged by a whole factor so pixel art stays sharp.
+    scale = min(size[0] // max(1, image.width), size[1] // max(1, image.height))
+    if scale > 1:
+        image = image.resize((image.width * scale, image.height * scale), nearest)
+    else:
+        image.thumbnail(size, nearest)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=1)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+class PreviewLoader:
+    # Decodes preview thumbnails on a background thread. A new request
+    # abandons the previous one; results are (token, kind, value) tuples on
+    # the results queue, which the Tk loop polls.
+    def __init__(self, size, max_cache_bytes: int) -> None:
+        self.size = size
+        self.cache = ThumbnailCache(max_cache_bytes)
+        self.results = queue.Queue()
+        self._requests = queue.Queue()
+        self._token = 0
+        self._thread = None
+    def request(self, subject_dir: Path, animation: str) -> int:
+        self._token += 1
+        self._requests.put((self._token, subject_dir, animation))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="preview-loader", daemon=True)
+            self._thread.start()
+        return self._token
+    def cancel(self) -> None:
+        self._token += 1
+    def _run(self) -> None:
+        while True:
+            token, subject_dir, animation = self._requests.get()
+            if token != self._token:
+                continue
+            paths = collect_preview_frame_paths(subject_dir, animation)
+            self.results.put((token, "count", len(paths)))
+            for path in paths:
+                if token != self._token:
+                    break
+                try:
+                    stat = path.stat()
+                    key = (str(path), stat.st_mtime_ns, stat.st_size, self.size)
+                    data = self.cache.get(key)
+                    if data is None:
+                        data = render_thumbnail(path, self.size)
+                        self.cache.put(key, data)
+                except Exception as exc:
+                    self.results.put((token, "error", f"Cannot preview {path.name}: {exc}"))
+                    break
+                self.results.put((token, "frame", data))
 class ConfigManagerUI(tk.Tk):
     def __init__(self) -> None:
         super().__init__()
@@ -72,6 +222,9 @@ class ConfigManagerUI(tk.Tk):
         self.subject_options = []
         self.game_theme_options = []
         self.theme_config_cache = {}
+        self.directory_snapshot = DirectorySnapshot()
+        self._snapshot_queue = queue.Queue()
+        self._snapshot_check_running = False
         self._none_subject_memory = self.root_config.get("subject") or None
         raw_is_hd = self.root_config.get("is_hd")
         self._none_is_hd_memory = self._normalize_is_hd_value(raw_is_hd)
@@ -96,12 +249,54 @@ class ConfigManagerUI(tk.Tk):
         self.recover_group = None
         self.recover_x_check = None
         self.recover_y_check = None
+        self._generation_thread = None
+        self._generation_queue = queue.Queue()
+        self._generation_cancel = threading.Event()
+        self._generation_started = 0.0
+        self._close_after_generation = False
+        self.preview_loader = PreviewLoader(PREVIEW_SIZE, PREVIEW_CACHE_BYTES)
+        self._preview_token = None
+        self._preview_expected = None
+        self._preview_frames = []
+        self._preview_index = 0
+        self._preview_play_after = None
+        self._preview_poll_after = None
         self._build_ui()
         self.populate_game_theme_options()
         self._initialize_selection()
         self.notebook.bind("<<NotebookTabChanged>>", self.on_notebook_tab_changed)
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
 
     def _on_window_focus_in(self, event: tk.Event) -> None:
+        # Fires for every widget that takes focus, so it only starts a
+        # background mtime check; the folders are reloaded when it finds a change.
+        if self._snapshot_check_running:
+            return
+        self._snapshot_check_running = True
+        listings = dict(self.directory_snapshot.listings)
+        threading.Thread(
+            target=lambda: self._snapshot_queue.put(rescan_changed_directories(listings)),
+            name="directory-snapshot",
+            daemon=True,
+        ).start()
+        self.after(50, self._poll_snapshot_check)
+    def _poll_snapshot_check(self) -> None:
+        try:
+            changed = self._snapshot_queue.get_nowait()
+        except queue.Empty:
+            self.after(50, self._poll_snapshot_check)
+            return
+        self._snapshot_check_running = False
+        previous = self.directory_snapshot.listings
+        modified = any(
+            directory not in previous or (previous[directory][0] is None) != (mtime is None) or previous[directory][1] != names
+            for directory, (mtime, names) in changed.items()
+        )
+        self.directory_snapshot.update(changed)
+        if modified:
+            self.reload_subjects()
+    def refresh_subjects(self) -> None:
+        self.directory_snapshot.clear()
         self.reload_subjects()
 
     def _ensure_runtime_assets(self) -> None:
@@ -148,7 +343,7 @@ class ConfigManagerUI(tk.Tk):
         self.subject_combo = ttk.Combobox(subject_header, textvariable=self.subject_var, state="readonly")
         self.subject_combo.grid(row=0, column=4, sticky="ew", padx=(6, 0))
         self.subject_combo.bind("<<ComboboxSelected>>", self.on_subject_change)
-        self.reload_button = ttk.Button(subject_header, text="Refresh", command=self.reload_subjects)
+        self.reload_button = ttk.Button(subject_header, text="Refresh", command=self.refresh_subjects)
         self.reload_button.grid(row=0, column=5, sticky="w", padx=(8, 0))
         self.help_button = ttk.Button(subject_header, text="?", width=3, command=self.show_about)
         self.help_button.grid(row=0, column=6, sticky="e", padx=(8, 0))
@@ -232,6 +427,33 @@ class ConfigManagerUI(tk.Tk):
         ttk.Label(sheet_group, text="For automatic sizing, leave it blank", foreground="gray",).grid(
             row=2, column=0, columnspan=2, sticky="w", pady=(4, 0)
         )
+        self.sheet_packer_var = tk.StringVar(value=DEFAULT_SUBJECT_CONFIG["sheet"]["packer"])
+        ttk.Label(sheet_group, text="Packing").grid(row=3, column=0, sticky="w", pady=(12, 4))
+        sheet_packer_combo = ttk.Combobox(
+            sheet_group, textvariable=self.sheet_packer_var, values=SHEET_PACKER_OPTIONS, state="readonly"
+        )
+        sheet_packer_combo.grid(row=3, column=1, sticky="ew", padx=(8, 0), pady=(12, 4))
+        self.subject_entries.append(sheet_packer_combo)
+        ttk.Label(sheet_group, text="'best' tries every packer and keeps the smallest sheet", foreground="gray",).grid(
+            row=4, column=0, columnspan=2, sticky="w", pady=(4, 0)
+        )
+        self.deduplicate_frames_var = tk.BooleanVar(value=False)
+        deduplicate_check = ttk.Checkbutton(
+            sheet_group,
+            text="Share duplicate frames",
+            variable=self.deduplicate_frames_var,
+        )
+        deduplicate_check.grid(row=5, column=0, columnspan=2, sticky="w", pady=(12, 4))
+        self.subject_entries.append(deduplicate_check)
+        self.duplicate_tolerance_var = tk.StringVar()
+        ttk.Label(sheet_group, text="Duplicate tolerance").grid(row=6, column=0, sticky="w", pady=4)
+        duplicate_tolerance_entry = ttk.Entry(sheet_group, textvariable=self.duplicate_tolerance_var)
+        duplicate_tolerance_entry.grid(row=6, column=1, sticky="ew", padx=(8, 0), pady=4)
+        duplicate_tolerance_entry.configure(validate="key", validatecommand=(self._integer_validate_callback, "%P"))
+        self.subject_entries.append(duplicate_tolerance_entry)
+        ttk.Label(sheet_group, text="Largest color difference for frames to count as the same", foreground="gray",).grid(
+            row=7, column=0, columnspan=2, sticky="w", pady=(0, 4)
+        )
         animations_frame = ttk.Frame(self.animations_tab, padding=outer_padding)
         animations_frame.pack(fill="both", expand=True)
         list_container = ttk.Frame(animations_frame, padding=section_padding)
@@ -247,7 +469,7 @@ class ConfigManagerUI(tk.Tk):
         self.reload_animations_button = ttk.Button(
             list_container,
             text="Refresh",
-            command=self.reload_animation_directories,
+            command=self.refresh_animation_directories,
         )
         self.reload_animations_button.pack(fill="x", pady=(8, 0))
         self.toggle_regenerate_button = ttk.Button(
@@ -327,10 +549,34 @@ class ConfigManagerUI(tk.Tk):
             foreground="gray",
         ).grid(row=1, column=0, columnspan=2, sticky="w", pady=(4, 0))
         self.animation_form_widgets.append(recover_group)
+        preview_group = ttk.LabelFrame(detail_frame, text="Preview", padding=section_padding)
+        preview_group.grid(row=5, column=0, columnspan=2, sticky="nsew", pady=(12, 0))
+        self.preview_canvas = tk.Canvas(
+            preview_group,
+            width=PREVIEW_SIZE[0],
+            height=PREVIEW_SIZE[1],
+            highlightthickness=0,
+        )
+        self.preview_canvas.pack(expand=True)
+        self.preview_image_item = self.preview_canvas.create_image(PREVIEW_SIZE[0] // 2, PREVIEW_SIZE[1], anchor="s")
+        self.preview_text_item = self.preview_canvas.create_text(
+            PREVIEW_SIZE[0] // 2, PREVIEW_SIZE[1] // 2, fill="gray", width=PREVIEW_SIZE[0]
+        )
         detail_frame.rowconfigure(5, weight=1)
     
+        self.progress_frame = ttk.Frame(self, padding=(outer_padding, 0, outer_padding, section_padding))
+        self.progress_frame.columnconfigure(0, weight=1)
+        self.progress_bar = ttk.Progressbar(self.progress_frame, mode="determinate")
+        self.progress_bar.grid(row=0, column=0, sticky="ew")
+        self.cancel_button = ttk.Button(self.progress_frame, text="Cancel", command=self.cancel_generation)
+        self.cancel_button.grid(row=0, column=1, padx=(8, 0))
+        self.progress_status_var = tk.StringVar(value="")
+        ttk.Label(self.progress_frame, textvariable=self.progress_status_var, foreground="gray").grid(
+            row=1, column=0, columnspan=2, sticky="w", pady=(4, 0)
+        )
         bottom_frame = ttk.Frame(self, padding=(outer_padding, 0, outer_padding, outer_padding))
         bottom_frame.pack(fill="x")
+        self.bottom_frame = bottom_frame
         self.reduce_file_size_check = ttk.Checkbutton(
             bottom_frame,
             text="Reduce file size",
@@ -405,13 +651,7 @@ class ConfigManagerUI(tk.Tk):
     
     def discover_subjects(self, game_theme=None):
         base_dir = self.root_dir if not game_theme else self.root_dir / game_theme
-        if not base_dir.is_dir():
-            return []
-        subjects = []
-        for entry in sorted(base_dir.iterdir(), key=lambda item: item.name.lower()):
-            if entry.is_dir() and not entry.name.startswith((".", "_", "assets")):
-                subjects.append(entry.name)
-        return subjects
+        return [name for name in self.directory_snapshot.children(base_dir) if is_subject_directory_name(name)]
     def _format_game_theme_value(self, value):
         return "None" if not value else str(value)
     def _parse_game_theme_value(self, value):
@@ -529,14 +769,13 @@ class ConfigManagerUI(tk.Tk):
         self.refresh_animation_list()
     def _load_animation_data(self, raw_dir: Path):
         animations = {}
-        if raw_dir.is_dir():
-            for entry in sorted(raw_dir.iterdir(), key=lambda item: item.name.lower()):
-                if entry.is_dir() and not entry.name.startswith((".", "_")):
-                    config_path = entry / "config.json"
-                    config = self._ensure_animation_defaults(
-                        self._read_json(config_path, DEFAULT_ANIMATION_CONFIG)
-                    )
-                    animations[entry.name] = {"path": config_path, "data": config}
+        for name in self.directory_snapshot.children(raw_dir):
+            if not name.startswith((".", "_")):
+                config_path = raw_dir / name / "config.json"
+                config = self._ensure_animation_defaults(
+                    self._read_json(config_path, DEFAULT_ANIMATION_CONFIG)
+                )
+                animations[name] = {"path": config_path, "data": config}
         return animations
     def _ensure_subject_defaults(self, data: dict) -> dict:
         result = copy.deepcopy(data) if isinstance(data, dict) else {}
@@ -547,9 +786,12 @@ class ConfigManagerUI(tk.Tk):
         result.setdefault("color_threshold", DEFAULT_SUBJECT_CONFIG["color_threshold"])
         result.setdefault("remove_background", DEFAULT_SUBJECT_CONFIG.get("remove_background", True))
         result.setdefault("crop_sprites", DEFAULT_SUBJECT_CONFIG.get("crop_sprites", True))
+        result.setdefault("deduplicate_frames", DEFAULT_SUBJECT_CONFIG["deduplicate_frames"])
+        result.setdefault("duplicate_tolerance", DEFAULT_SUBJECT_CONFIG["duplicate_tolerance"])
         sheet = result.setdefault("sheet", {})
         sheet.setdefault("width", None)
         sheet.setdefault("height", None)
+        sheet.setdefault("packer", DEFAULT_SUBJECT_CONFIG["sheet"]["packer"])
         return result
     def _sync_reduce_file_size_from_subject(self) -> None:
         if not isinstance(self.subject_config_data, dict):
@@ -580,9 +822,13 @@ class ConfigManagerUI(tk.Tk):
         # boolean fields
         self.remove_background_var.set(bool(self.subject_config_data.get("remove_background", True)))
         self.crop_sprites_var.set(bool(self.subject_config_data.get("crop_sprites", True)))
+        self.deduplicate_frames_var.set(bool(self.subject_config_data.get("deduplicate_frames", False)))
+        self.duplicate_tolerance_var.set(self._format_number(self.subject_config_data.get("duplicate_tolerance")))
         sheet = self.subject_config_data.get("sheet", {})
         self.sheet_width_var.set(self._format_number(sheet.get("width")))
         self.sheet_height_var.set(self._format_number(sheet.get("height")))
+        packer = sheet.get("packer")
+        self.sheet_packer_var.set(packer if packer in SHEET_PACKER_OPTIONS else DEFAULT_SUBJECT_CONFIG["sheet"]["packer"])
     def refresh_animation_list(self, preferred=None) -> None:
         self.animation_listbox.delete(0, tk.END)
         self.animation_names = sorted(self.animation_data.keys(), key=lambda name: name.lower())
@@ -622,6 +868,65 @@ class ConfigManagerUI(tk.Tk):
         self.anim_recover_x_var.set(bool(recover.get("x", True)))
         self.anim_recover_y_var.set(bool(recover.get("y", True)))
         self.update_animation_form_state(True)
+        self._start_preview(name)
+    def _start_preview(self, name: str) -> None:
+        self._stop_preview()
+        subject_dir = self._resolve_subject_dir(self.current_subject_name, self.current_game_theme)
+        self._preview_token = self.preview_loader.request(subject_dir, name)
+        self.preview_canvas.itemconfigure(self.preview_text_item, text="Loading...")
+        self._preview_poll_after = self.after(30, self._poll_preview)
+    def _stop_preview(self) -> None:
+        if self._preview_play_after is not None:
+            self.after_cancel(self._preview_play_after)
+            self._preview_play_after = None
+        if self._preview_poll_after is not None:
+            self.after_cancel(self._preview_poll_after)
+            self._preview_poll_after = None
+        if self._preview_token is not None:
+            self.preview_loader.cancel()
+        self._preview_token = None
+        self._preview_expected = None
+        self._preview_frames = []
+        self._preview_index = 0
+        self.preview_canvas.itemconfigure(self.preview_image_item, image="")
+        self.preview_canvas.itemconfigure(self.preview_text_item, text="")
+    def _poll_preview(self) -> None:
+        self._preview_poll_after = None
+        if self._preview_token is None:
+            return
+        while True:
+            try:
+                token, kind, value = self.preview_loader.results.get_nowait()
+            except queue.Empty:
+                break
+            if token != self._preview_token:
+                continue
+            if kind == "count":
+                self._preview_expected = value
+                if not value:
+                    self.preview_canvas.itemconfigure(self.preview_text_item, text="No frames found")
+            elif kind == "frame":
+                self._preview_frames.append(tk.PhotoImage(data=value))
+                if len(self._preview_frames) == 1:
+                    self.preview_canvas.itemconfigure(self.preview_text_item, text="")
+                    self._show_preview_frame()
+            else:
+                self.preview_canvas.itemconfigure(self.preview_text_item, text=value)
+                self._preview_expected = len(self._preview_frames)
+        if self._preview_expected is None or len(self._preview_frames) < self._preview_expected:
+            self._preview_poll_after = self.after(30, self._poll_preview)
+    def _show_preview_frame(self) -> None:
+        # Plays the frames loaded so far, using the delay currently entered.
+        self.preview_canvas.itemconfigure(self.preview_image_item, image=self._preview_frames[self._preview_index])
+        delay = self._parse_number(self.anim_delay_var.get(), DEFAULT_ANIMATION_CONFIG["delay"])
+        interval = max(10, int(round(max(1, delay) * PREVIEW_TICK_MS)))
+        self._preview_play_after = self.after(interval, self._advance_preview)
+    def _advance_preview(self) -> None:
+        self._preview_play_after = None
+        if not self._preview_frames:
+            return
+        self._preview_index = (self._preview_index + 1) % len(self._preview_frames)
+        self._show_preview_frame()
     def on_animation_selected(self, event=None) -> None:
         selection = self.animation_listbox.curselection()
         if not selection:
@@ -650,6 +955,11 @@ class ConfigManagerUI(tk.Tk):
             self.animation_listbox.activate(index)
             self.animation_listbox.see(index)
         self.display_animation(self.animation_names[index])
+    def refresh_animation_directories(self) -> None:
+        if self.current_subject_name:
+            subject_dir = self._resolve_subject_dir(self.current_subject_name, self.current_game_theme)
+            self.directory_snapshot.forget(subject_dir / "raw")
+        self.reload_animation_directories()
     def reload_animation_directories(self) -> None:
         if not self.current_subject_name:
             return
@@ -659,17 +969,15 @@ class ConfigManagerUI(tk.Tk):
         previous_selection = self.current_animation
         existing_names = set(self.animation_data.keys())
         discovered_names = []
-        if raw_dir.is_dir():
-            for entry in sorted(raw_dir.iterdir(), key=lambda item: item.name.lower()):
-                if entry.is_dir() and not entry.name.startswith((".", "_")):
-                    name = entry.name
-                    discovered_names.append(name)
-                    if name not in self.animation_data:
-                        config_path = entry / "config.json"
-                        config = self._ensure_animation_defaults(
-                            self._read_json(config_path, DEFAULT_ANIMATION_CONFIG)
-                        )
-                        self.animation_data[name] = {"path": config_path, "data": config}
+        for name in self.directory_snapshot.children(raw_dir):
+            if not name.startswith((".", "_")):
+                discovered_names.append(name)
+                if name not in self.animation_data:
+                    config_path = raw_dir / name / "config.json"
+                    config = self._ensure_animation_defaults(
+                        self._read_json(config_path, DEFAULT_ANIMATION_CONFIG)
+                    )
+                    self.animation_data[name] = {"path": config_path, "data": config}
         discovered_set = set(discovered_names)
         missing_names = existing_names - discovered_set
         for name in missing_names:
@@ -702,9 +1010,14 @@ class ConfigManagerUI(tk.Tk):
         # boolean fields
         self.subject_config_data["remove_background"] = bool(self.remove_background_var.get())
         self.subject_config_data["crop_sprites"] = bool(self.crop_sprites_var.get())
+        self.subject_config_data["deduplicate_frames"] = bool(self.deduplicate_frames_var.get())
+        self.subject_config_data["duplicate_tolerance"] = self._parse_number(
+            self.duplicate_tolerance_var.get(), DEFAULT_SUBJECT_CONFIG["duplicate_tolerance"]
+        )
         sheet = self.subject_config_data.setdefault("sheet", {})
         sheet["width"] = self._parse_optional_number(self.sheet_width_var.get())
         sheet["height"] = self._parse_optional_number(self.sheet_height_var.get())
+        sheet["packer"] = self.sheet_packer_var.get() or DEFAULT_SUBJECT_CONFIG["sheet"]["packer"]
     def _apply_animation_form_to_data(self) -> None:
         if not self.current_animation or self.current_animation not in self.animation_data:
             return
@@ -780,68 +1093,130 @@ class ConfigManagerUI(tk.Tk):
         return True
     
     def save_and_generate(self) -> None:
+        if self._generation_thread is not None:
+            return
         if not self.save_all(show_message=False):
             return
-        if getattr(sys, "frozen", False):
-            success = self._run_generator_embedded()
-        else:
-            success = self._run_generator_subprocess()
-        if success:
-            messagebox.showinfo(
-                'Save & Generate',
-                "Saved configuration and generated the spritesheet into <SubjectName>/generated successfully.",
-            )
-    def _run_generator_subprocess(self) -> bool:
-        try:
-            result = subprocess.run(
-                [sys.executable, str(self.root_dir / "sprite_rips_to_mm_sprite_resources.py")],
-                cwd=self.root_dir,
-                capture_output=True,
-                text=True,
-            )
-        except OSError as exc:
-            messagebox.showerror('Save & Generate', f"Failed to run sprite_rips_to_mm_sprite_resources.py:\n{exc}")
-            return False
-        if result.returncode == 0:
-            return True
-        error_output = result.stderr.strip() or result.stdout.strip() or "No output."
-        messagebox.showerror(
-            'Save & Generate',
-            f"sprite_rips_to_mm_sprite_resources.py exited with code {result.returncode}:\n\n{error_output}",
-        )
-        return False
-    def _run_generator_embedded(self) -> bool:
         try:
-            from sprite_rips_to_mm_sprite_resources import main as generator_main
+            from sprite_rips_to_mm_sprite_resources import GenerateOptions, GenerationProgress, generate, load_generation_target
         except Exception as exc:
             messagebox.showerror(
                 'Save & Generate',
                 "Failed to import sprite_rips_to_mm_sprite_resources:\n" + str(exc),
             )
-            return False
-        previous_cwd = os.getcwd()
-        try:
-            os.chdir(self.root_dir)
+            return
+        self._generation_cancel.clear()
+        progress = GenerationProgress(self._generation_queue.put, self._generation_cancel)
+
+        def run() -> None:
             try:
-                generator_main()
-            except SystemExit as exc:
-                code = exc.code
-                if code not in (None, 0):
-                    if isinstance(code, int):
-                        message = f"sprite_rips_to_mm_sprite_resources exited with code {code}."
-                    else:
-                        message = str(code) or "sprite_rips_to_mm_sprite_resources exited with a non-zero status."
-                    messagebox.showerror('Save & Generate', message)
-                    return False
-        except Exception as exc:
+                target = load_generation_target(self.root_dir)
+                result = generate(
+                    target.subject_path,
+                    GenerateOptions(
+                        is_hd=target.is_hd,
+                        reduce_file_size=target.reduce_file_size,
+                        subject_name=target.subject_name,
+                        progress=progress,
+                    ),
+                )
+            except BaseException as exc:
+                self._generation_queue.put(("failed", exc))
+            else:
+                self._generation_queue.put(("finished", result))
+
+        self._set_generation_running(True)
+        self._generation_started = time.monotonic()
+        self._generation_thread = threading.Thread(target=run, name="generator", daemon=True)
+        self._generation_thread.start()
+        self.after(100, self._poll_generation)
+    def cancel_generation(self) -> None:
+        if self._generation_thread is None:
+            return
+        self._generation_cancel.set()
+        self.cancel_button.state(["disabled"])
+        self.progress_status_var.set("Cancelling...")
+    def _set_generation_running(self, running: bool) -> None:
+        state = ["disabled"] if running else ["!disabled"]
+        self.save_and_generate_button.state(state)
+        self.save_button.state(state)
+        if running:
+            self.progress_bar.configure(value=0, maximum=1)
+            self.progress_status_var.set("Starting...")
+            self.cancel_button.state(["!disabled"])
+            self.progress_frame.pack(fill="x", before=self.bottom_frame)
+        else:
+            self.progress_frame.pack_forget()
+    def _poll_generation(self) -> None:
+        outcome = None
+        while True:
+            try:
+                message = self._generation_queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(message, tuple):
+                outcome = message
+            elif not self._generation_cancel.is_set():
+                self._show_generation_progress(message)
+        if outcome is None:
+            self.after(100, self._poll_generation)
+            return
+        self._generation_thread.join()
+        self._generation_thread = None
+        self._set_generation_running(False)
+        if self._close_after_generation:
+            self.destroy()
+            return
+        self._report_generation_outcome(*outcome)
+    def _show_generation_progress(self, update) -> None:
+        # The bar covers the frames plus one step each for layout, the sheet
+        # image and writing the files.
+        total = update.frames_total + 3
+        steps = {"layout": update.frames_total, "sheet": update.frames_total + 1, "write": update.frames_total + 2, "done": total}
+        self.progress_bar.configure(maximum=total, value=steps.get(update.stage, update.frames_done))
+        if update.stage == "frames":
+            text = f"Processing frames: {update.frames_done}/{update.frames_total}"
+            if update.animation:
+                text = f"Processing {update.animation}: {update.frames_done}/{update.frames_total} frames"
+            if 0 < update.frames_done < update.frames_total:
+                elapsed = time.monotonic() - self._generation_started
+                remaining = elapsed / update.frames_done * (update.frames_total - update.frames_done)
+                text += f", about {self._format_duration(remaining)} left"
+        else:
+            text = {
+                "layout": "Laying out the sprite sheet...",
+                "sheet": "Building the sprite sheet...",
+                "write": "Writing the sprite sheets and .sprite file...",
+            }.get(update.stage, "Finishing...")
+        self.progress_status_var.set(text)
+    def _format_duration(self, seconds: float) -> str:
+        seconds = int(round(seconds))
+        if seconds < 60:
+            return f"{seconds}s"
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    def _report_generation_outcome(self, status: str, value) -> None:
+        from sprite_rips_to_mm_sprite_resources import GenerationCancelled, GeneratorError
+
+        if status == "finished":
+            messagebox.showinfo(
+                'Save & Generate',
+                "Saved configuration and generated the spritesheet into <SubjectName>/generated successfully.",
+            )
+        elif isinstance(value, GenerationCancelled):
+            messagebox.showinfo('Save & Generate', "Generation was cancelled. The generated folder was left unchanged.")
+        elif isinstance(value, GeneratorError):
+            messagebox.showerror('Save & Generate', str(value))
+        else:
             messagebox.showerror(
                 'Save & Generate',
-                "Failed to run embedded generator:\n" + str(exc),
+                "Failed to run the generator:\n" + str(value),
             )
-            return False
-        finally:
-            os.chdir(previous_cwd)
-        return True
+    def _on_close(self) -> None:
+        if self._generation_thread is None:
+            self.destroy()
+            return
+        self._close_after_generation = True
+        self.cancel_generation()
     def _write_json(self, path: Path, data: dict) -> None:
         path.parent.mkdir(parents=True, exist_ok=True)
         with path.open("w", encoding="utf-8") as handle:
@@ -1152,9 +1527,13 @@ class ConfigManagerUI(tk.Tk):
         self.color_threshold_var.set("")
         self.sheet_width_var.set("")
         self.sheet_height_var.set("")
+        self.sheet_packer_var.set(DEFAULT_SUBJECT_CONFIG["sheet"]["packer"])
         self.remove_background_var.set(DEFAULT_SUBJECT_CONFIG.get("remove_background", True))
         self.crop_sprites_var.set(DEFAULT_SUBJECT_CONFIG.get("crop_sprites", True))
+        self.deduplicate_frames_var.set(DEFAULT_SUBJECT_CONFIG["deduplicate_frames"])
+        self.duplicate_tolerance_var.set("")
     def clear_animation_form(self) -> None:
+        self._stop_preview()
         self.anim_rege_var.set(True)
         self._update_regenerate_dependents_state()
         self.anim_delay_var.set("")